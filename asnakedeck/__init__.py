@@ -4,8 +4,6 @@ AsyncIO StreamDeck controller for Linux
 """
 from __future__ import annotations
 
-import pluggy
-
 
 def __getattr__(name):
     if name == "__version__":
@@ -18,8 +16,12 @@ def __getattr__(name):
             __version__ = "0.0.0dev0"
         globals()['__version__'] = __version__
         return __version__
+    if name == "hookimpl":
+        # Only plugins need pluggy, so don't import it until one asks for it
+        import pluggy
 
-    raise AttributeError(f"module {__name__} has no attribute {name}")
-
+        hookimpl = pluggy.HookimplMarker("asnakedeck")
+        globals()['hookimpl'] = hookimpl
+        return hookimpl
 
-hookimpl = pluggy.HookimplMarker("asnakedeck")
+    raise AttributeError(f"module {__name__} has no attribute {name}")
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-import asyncio
+# Keep the imports here to a minimum -- anything imported at the top level slows down every command, including
+# shell completion. Import what each command needs inside it instead.
+from . import profiling  # isort: skip
+
 import importlib
 import logging
 import os
@@ -11,16 +14,19 @@ import typer
 
 from . import platform
 
-logging.basicConfig(level=logging.DEBUG)
+profiling.mark("import cli")
 
 cli = typer.Typer()
+log = logging.getLogger(__name__)
 
 
 async def real_hardware() -> None:
-    from StreamDeck.DeviceManager import DeviceManager
+    import asyncio
 
-    from .deck import Deck
     from .plugin_manager import PluginManager
+    from .supervisor import DeviceSupervisor
+
+    profiling.mark("import deck")
 
     task = asyncio.current_task()
     assert task
@@ -30,25 +36,49 @@ async def real_hardware() -> None:
         # Pre-load hidapi.dll so we can "find" it
         preload_dll()
 
-    dm = DeviceManager()
+    pm = PluginManager()
 
-    decks: list[Deck] = []
+    control = await start_control_server()
 
-    pm = PluginManager()
+    def started():
+        profiling.mark("open decks")
+        profiling.report()
+
+    # Decks are opened as they are found, and again if they are unplugged and plugged back in
+    supervisor = DeviceSupervisor(pm)
+    try:
+        await supervisor.run(ready=started)
+    finally:
+        supervisor.close()
+        if control:
+            control.close()
 
-    for device in dm.enumerate():
-        deck = Deck(device, plugin_manager=pm)
-        decks.append(deck)
-        deck.open()
 
-    while True:
-        try:
-            tasks = [task for deck in decks for task in deck.tasks]
-            if not tasks:
-                break
-            await asyncio.gather(*tasks)
-        except KeyboardInterrupt:
-            break
+async def start_control_server():
+    if platform.WINDOWS:
+        return None
+
+    import json
+
+    from .control import ControlServer
+    from .stats import latency
+    from .taskstats import accounting
+
+    def latency_stats(format: str = "text") -> str:
+        return latency.format_prometheus() if format == "prometheus" else latency.format_text()
+
+    def task_stats() -> str:
+        return json.dumps({"enabled": accounting.installed, "tasks": accounting.snapshot()})
+
+    control = ControlServer()
+    control.register("latency", latency_stats)
+    control.register("tasks", task_stats)
+    try:
+        await control.start()
+    except OSError as e:
+        log.warning("Unable to listen on %s, the stats command won't work: %s", control.path, e)
+        return None
+    return control
 
 
 def preload_dll():
@@ -65,14 +95,18 @@ def all_serial_numbers():
 
 @cache
 def all_deck_types():
-    import importlib
+    import importlib.util
     import pkgutil
 
-    mod = importlib.import_module('StreamDeck.Devices')
+    # Find the modules without importing the StreamDeck library
+    spec = importlib.util.find_spec('StreamDeck')
+    if not spec or not spec.submodule_search_locations:
+        return []
+    path = [os.path.join(location, 'Devices') for location in spec.submodule_search_locations]
 
     return [
         submod.name
-        for submod in pkgutil.iter_modules(mod.__path__)
+        for submod in pkgutil.iter_modules(path)
         # Ignore the ABC
         if submod.name != "StreamDeck"
     ]
@@ -92,16 +126,47 @@ def validate_kind(kind: str):
 
 
 @cli.command()
-def fake(serial: str, kind=typer.Option(..., callback=validate_kind)):
+def fake(
+    serial: str,
+    kind=typer.Option(..., callback=validate_kind),
+    headless: bool = typer.Option(False, "--headless", help="Don't open a window, just record the frames sent to each key"),
+    script: Path = typer.Option(None, "--script", exists=True, dir_okay=False, help="With --headless, YAML list of key presses to make"),
+    duration: float = typer.Option(None, "--duration", help="With --headless, stop after this many seconds"),
+):
+    import asyncio
+
+    if headless:
+        from .simulation.headless import main as headless_main
+
+        profiling.mark("import simulation")
+        profiling.report()
+
+        asyncio.run(headless_main(serial, kind, script=script, duration=duration))
+        return
+
     os.environ.setdefault('KIVY_LOG_MODE', 'MIXED')
 
     from .simulation.app import main
 
+    profiling.mark("import simulation")
+    profiling.report()
+
     asyncio.run(main(serial, kind))
 
 
 @cli.command()
-def run():
+def run(
+    profile_tasks: bool = typer.Option(False, "--profile-tasks", help="Time every task step on the event loop, for the `top` command"),
+    slow_step_ms: float = typer.Option(50, "--slow-step-ms", help="With --profile-tasks, log task steps slower than this"),
+):
+    import asyncio
+
+    if profile_tasks:
+        from .taskstats import accounting
+
+        accounting.threshold = slow_step_ms / 1000
+        accounting.install()
+
     try:
         asyncio.run(real_hardware())
     except KeyboardInterrupt:
@@ -122,10 +187,81 @@ def deck_types():
         print(kind)
 
 
+@cli.command()
+def plugins(rebuild: bool = typer.Option(False, "--rebuild", help="Rescan installed packages and rebuild the plugin index")):
+    """List the plugins found in installed packages"""
+    from .plugin_manager import PluginManager
+
+    pm = PluginManager()
+    eps = pm.rebuild_entrypoint_index() if rebuild else pm.setuptools_entrypoints
+    for kind, entries in sorted(eps.items()):
+        for name, ep in sorted(entries.items()):
+            print(f"{kind}\t{name}\t{ep.value}")
+
+
+@cli.command()
+def stats(prometheus: bool = typer.Option(False, "--prometheus", help="Output in Prometheus text exposition format")):
+    """Show key press latency histograms from the running process"""
+    from .control import request, socket_path
+
+    try:
+        print(request("latency", "prometheus" if prometheus else "text"), end="")
+    except OSError as e:
+        typer.echo(f"Unable to talk to asnakedeck on {socket_path()}, is it running? ({e})", err=True)
+        raise typer.Exit(1)
+
+
+@cli.command()
+def top(
+    interval: float = typer.Option(2.0, "--interval", "-d", help="Seconds between updates"),
+    limit: int = typer.Option(20, "--limit", "-n", help="How many tasks to show"),
+    iterations: int = typer.Option(0, "--iterations", help="Stop after this many updates (0 for no limit)"),
+):
+    """Show which tasks in the running process are keeping the event loop busy (needs `run --profile-tasks`)"""
+    import itertools
+    import json
+    import sys
+    import time
+
+    from .control import request, socket_path
+    from .taskstats import format_top
+
+    previous: dict = {}
+    last = time.monotonic()
+    for n in itertools.count(1):
+        try:
+            response = json.loads(request("tasks"))
+        except OSError as e:
+            typer.echo(f"Unable to talk to asnakedeck on {socket_path()}, is it running? ({e})", err=True)
+            raise typer.Exit(1)
+        if not response["enabled"]:
+            typer.echo("Task accounting is not enabled, start asnakedeck with `run --profile-tasks`", err=True)
+            raise typer.Exit(1)
+
+        now = time.monotonic()
+        if sys.stdout.isatty():
+            print("\033[H\033[2J", end="")
+        # The first update covers everything since the process started, after that it's per interval
+        print(format_top(response["tasks"], previous, (now - last) if previous else 1.0, limit), flush=True)
+        previous, last = response["tasks"], now
+
+        if iterations and n >= iterations:
+            break
+        time.sleep(interval)
+
+
 @cli.callback(invoke_without_command=True)
-def default(ctx: typer.Context):
+def default(
+    ctx: typer.Context,
+    profile_startup: bool = typer.Option(False, "--profile-startup", help="Report how long each phase of startup took"),
+):
+    logging.basicConfig(level=logging.DEBUG)
+    if profile_startup:
+        profiling.enabled = True
+        ctx.call_on_close(profiling.report)
+    profiling.mark("parse arguments")
     if ctx.invoked_subcommand is None:
-        return ctx.invoke(run)
+        return ctx.invoke(run, profile_tasks=False, slow_step_ms=50)
 
 
 # Run event loop until main_task finishes
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import pickle
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+from . import platform
+from .files import atomic_write_bytes
+
+log = logging.getLogger(__name__)
+
+# Use the libyaml parser if it's available, it's many times faster than the pure-python one
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Bump this if the shape of what we store in the cache changes
+CACHE_VERSION = 1
+
+
+def parse_config(data: bytes) -> dict[str, Any] | None:
+    config = yaml.load(data, Loader=SafeLoader)
+
+    # Support snakedeck format where config is just a list
+    if isinstance(config, list):
+        config = {"keys": config}
+
+    return config or None
+
+
+def cache_path_for(path: Path) -> Path:
+    return platform.STATE_DIR / "config-cache" / (path.name + ".pickle")
+
+
+def load_config_file(path: Path) -> dict[str, Any] | None:
+    """
+    Load and parse a deck config file.
+
+    The parsed config is cached in :data:`platform.STATE_DIR`, keyed on the mtime and a hash of the file, so that
+    unchanged files don't have to be parsed again on the next start.
+    """
+    data = path.read_bytes()
+    fingerprint = (CACHE_VERSION, path.stat().st_mtime_ns, hashlib.blake2b(data, digest_size=16).digest())
+    cache_path = cache_path_for(path)
+
+    try:
+        with cache_path.open("rb") as fh:
+            cached_fingerprint, config = pickle.load(fh)
+        if cached_fingerprint == fingerprint:
+            log.debug("Loaded %s from cache %s", path, cache_path)
+            return config
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        log.debug("Ignoring unreadable config cache %s: %s", cache_path, e)
+
+    config = parse_config(data)
+
+    try:
+        # So that a reader never sees a half-written cache
+        atomic_write_bytes(cache_path, pickle.dumps((fingerprint, config), protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError as e:
+        log.warning("Unable to write config cache %s: %s", cache_path, e)
+
+    return config
@@ -0,0 +1,74 @@
+"""
+A local Unix socket that CLI commands use to ask the running process for information.
+
+The protocol is a single line, a command and its arguments separated by spaces, answered with text after which the
+connection is closed.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+from collections.abc import Callable
+from pathlib import Path
+
+import attr
+
+from . import platform
+
+log = logging.getLogger(__name__)
+
+
+def socket_path() -> Path:
+    return platform.STATE_DIR / "control.sock"
+
+
+@attr.define
+class ControlServer:
+    path: Path = attr.ib(factory=socket_path)
+    commands: dict[str, Callable[..., str]] = attr.Factory(dict)
+    server: asyncio.AbstractServer | None = attr.ib(default=None, repr=False)
+
+    def register(self, name: str, func: Callable[..., str]) -> None:
+        self.commands[name] = func
+
+    async def start(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # A socket left over from a process that didn't shut down cleanly
+        self.path.unlink(missing_ok=True)
+        self.server = await asyncio.start_unix_server(self._handle, path=os.fspath(self.path))
+        self.path.chmod(0o600)
+
+    def close(self) -> None:
+        if self.server:
+            self.server.close()
+            self.server = None
+            self.path.unlink(missing_ok=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            name, *args = (await reader.readline()).decode().split()
+            if func := self.commands.get(name):
+                response = func(*args)
+            else:
+                response = f"Unknown command {name!r}, expected one of {', '.join(sorted(self.commands))}\n"
+        except Exception as e:
+            log.exception("Error handling control command")
+            response = f"Error: {e}\n"
+        writer.write(response.encode())
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+def request(*command: str, path: Path | None = None) -> str:
+    """Send a command to the running process and return the response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(os.fspath(path or socket_path()))
+        sock.sendall((" ".join(command) + "\n").encode())
+        chunks = []
+        while chunk := sock.recv(65536):
+            chunks.append(chunk)
+    return b"".join(chunks).decode()
@@ -1,27 +1,35 @@
 from __future__ import annotations
 
 import asyncio
-import functools
 import itertools
 import logging
 import operator
 import os
+import time
 from asyncio.tasks import Task
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable
+from concurrent.futures import Executor
 from functools import cached_property
 from pathlib import Path
 from typing import TYPE_CHECKING
 
 import attr
-import yaml
-from PIL import ImageFont
 from StreamDeck.Transport.Transport import TransportError
 
 from asnakedeck.types import Key
 
 from . import platform
+from .config import load_config_file
+from .hooks import ConfigLoaded, FrameRendered, KeyPressed
+from .panel import DEFAULT_GAP, Panel
+from .reader import KeyReader
+from .rendering import KeyImageFormat, get_executor
+from .stats import FRAME_WINDOW, latency
+from .text import load_font
+from .writer import DeviceWriter
 
 if TYPE_CHECKING:
+    from PIL import Image, ImageFont
     from StreamDeck.Devices.StreamDeck import StreamDeck
 
     from .plugin_manager import PluginManager
@@ -35,14 +43,44 @@ class Deck:
     hardware: StreamDeck
     plugin_manager: PluginManager
     keys: dict[int, Key] = attr.Factory(dict)
+    # Called once the deck has been closed, whatever closed it
+    on_close: Callable[[Deck], None] | None = attr.ib(default=None, kw_only=True, repr=False)
     image_size: tuple[int, int] = attr.ib(init=False)
+    writer: DeviceWriter = attr.ib(init=False, repr=False)
+    panel: Panel | None = attr.ib(init=False, default=None, repr=False)
+    reader: KeyReader | None = attr.ib(init=False, default=None, repr=False)
+    config_watcher_task: Task | None = attr.ib(init=False, default=None, repr=False)
+    closed: bool = attr.ib(init=False, default=False, repr=False)
+    # Whether plugins have been told about this deck, and so need telling when it goes away
+    _announced: bool = attr.ib(init=False, default=False, repr=False)
+    # When the last press of each key was read from the device, until the key is next redrawn
+    _pressed_at: dict[int, float] = attr.ib(init=False, factory=dict, repr=False)
 
     def __attrs_post_init__(self):
         platform.CONFIG_DIR.mkdir(parents=True, exist_ok=True)
         # But don't start the read thread just yet!
         self.hardware.device.open()
-        self.hardware.set_key_callback_async(self.on_keypress)
+        try:
+            self._setup()
+        except BaseException:
+            # Don't leave the writer running or the config watched for a deck nothing has hold of
+            self.close(reset=False)
+            raise
+
+        self._announced = True
+        self.plugin_manager.events.emit("asnakedeck_deck_added", self)
+
+    def _setup(self) -> None:
+        loop = asyncio.get_event_loop()
+
+        def on_key_report(hardware, key_number: int, state: bool):
+            # Called from the library's read thread, so note the time before hopping over to the loop
+            asyncio.run_coroutine_threadsafe(self.on_keypress(hardware, key_number, state, time.monotonic()), loop)
+
+        self.hardware.set_key_callback(on_key_report)
         self.image_size = self.hardware.key_image_format()["size"]
+        self.writer = DeviceWriter(self.hardware, name=self.serial_number)
+        self.writer.start()
 
         if log.isEnabledFor(logging.DEBUG):
             log.debug(
@@ -55,20 +93,27 @@ class Deck:
         self.load_config()
 
         if not platform.WINDOWS:
-            from .platform.linux import watch_file_for_changes
+            from .platform.linux import shared_directory_watcher
 
             async def file_change(_):
                 self.load_config()
 
-            self.config_watcher_task = asyncio.create_task(watch_file_for_changes(self.config_file_path, file_change), name="config-watcher")
-            self.config_watcher_task.add_done_callback(self.on_task_complete)
-        else:
-            self.config_watcher_task = None
+            # All decks share the one watcher on the config dir
+            watcher = shared_directory_watcher(platform.CONFIG_DIR, debounce=getattr(self, "config", {}).get("reload_debounce"))
+            task = self.config_watcher_task = watcher.subscribe(self.config_file_path.name, file_change)
+            task.add_done_callback(self.on_task_complete)
 
     def open(self):
+        if KeyReader.supported(self.hardware):
+            # Read key presses from the event loop, rather than from a thread polling the device
+            self.hardware._reset_key_stream()
+            self.reader = KeyReader(self.hardware, self.on_keypress)
+            self.reader.start()
+            return
         self.hardware.open()
-        assert self.hardware.read_thread
-        self.hardware.read_thread.setName(f"DeckThread-{self.serial_number}")
+        # Simulated decks don't have a thread, their key presses are made for them
+        if self.hardware.read_thread:
+            self.hardware.read_thread.setName(f"DeckThread-{self.serial_number}")
 
     def __hash__(self):
         return hash(self.serial_number)
@@ -85,7 +130,7 @@ class Deck:
         self.config_watcher_task = None
 
     def __del__(self):
-        if self.hardware.connected():
+        if not self.closed and self.hardware.connected():
             self.close()
 
         for key in self.keys.values():
@@ -102,22 +147,80 @@ class Deck:
 
     def clear(self):
         # Clear all keys
-        self.hardware.reset()
+        self.writer.reset()
+        blank = bytes(self.hardware.BLANK_KEY_IMAGE)
         for key in range(self.hardware.KEY_COUNT):
-            self.hardware.set_key_image(key, self.hardware.BLANK_KEY_IMAGE)
-        self.hardware.set_brightness(80)
+            self.set_key_image(key, blank)
+        self.writer.set_brightness(80)
         self.keys.clear()
 
+    def background_frame(self, key_number: int) -> bytes:
+        """What to show on a key that has nothing configured for it"""
+        if self.panel and (frame := self.panel.frame_for(key_number)):
+            return frame
+        return bytes(self.hardware.BLANK_KEY_IMAGE)
+
+    def set_panel_image(self, image: Image.Image | os.PathLike | str, gap: int | None = None) -> None:
+        """
+        Show one image across the whole deck.
+
+        Keys with something configured on them keep showing that, the panel is only visible on the others.
+        """
+        from PIL import Image
+
+        if not isinstance(image, Image.Image):
+            with Image.open(image) as fh:
+                image = fh.copy()
+        if not self.panel or (gap is not None and gap != self.panel.gap):
+            self.panel = Panel(self.key_format, cols=self.hardware.KEY_COLS, rows=self.hardware.KEY_ROWS, gap=DEFAULT_GAP if gap is None else gap)
+        for key_number, frame in self.panel.slice(image).items():
+            if key_number not in self.keys:
+                self.set_key_image(key_number, frame)
+
+    def set_key_image(self, key_number: int, image: bytes) -> None:
+        """Queue an image to be sent to a key, unless that key is already showing it"""
+        if (pressed_at := self._pressed_at.pop(key_number, None)) is not None and time.monotonic() - pressed_at > FRAME_WINDOW:
+            pressed_at = None
+        self.writer.set_key_image(key_number, image, pressed_at=pressed_at)
+        self.plugin_manager.events.emit("asnakedeck_frame_rendered", FrameRendered(self, key_number, image))
+
+    @property
+    def suppressed_writes(self) -> int:
+        return self.writer.suppressed_writes
+
     @property
     def key_tasks(self) -> Iterable[Task]:
         tasks = operator.attrgetter('tasks')
         return itertools.chain.from_iterable(map(tasks, self.keys.values()))
 
     def close(self, reset=True):
+        # Both the supervisor and the config watcher going away can close a deck
+        if self.closed:
+            return
+        self.closed = True
+        if self._announced:
+            self.plugin_manager.events.emit("asnakedeck_deck_removed", self)
+
+        if self.config_watcher_task:
+            from .platform.linux import shared_directory_watcher
+
+            self.config_watcher_task.remove_done_callback(self.on_task_complete)
+            self.config_watcher_task = None
+            shared_directory_watcher(platform.CONFIG_DIR).unsubscribe(self.config_file_path.name)
+
         for task in self.key_tasks:
             log.debug("Cancelling task %r: %s/%s", task.get_name(), task.cancelled(), task.done())
             task.cancel("Deck going away")
 
+        # If construction failed it might not have got as far as creating the writer
+        if writer := getattr(self, "writer", None):
+            log.debug("Deck %s writer stats: %r", self.serial_number, writer.stats())
+            writer.close()
+
+        if self.reader:
+            self.reader.stop()
+            self.reader = None
+
         # Work around issue where the deck doesn't close proplery and segfaults in usbi_mutex_destroy
         if self.hardware.read_thread:
             self.hardware.run_read_thread = False
@@ -131,72 +234,116 @@ class Deck:
                     pass
             self.hardware.close()
 
-    @functools.lru_cache
-    def _get_font(self, face: str, size: int):
-        return ImageFont.truetype(platform.resolve_font(face), size)
+        if self.on_close:
+            self.on_close(self)
+
+    @cached_property
+    def key_format(self) -> KeyImageFormat:
+        return KeyImageFormat.from_hardware(self.hardware)
+
+    @property
+    def render_executor(self) -> Executor:
+        pool = self.config.get("render_pool", {})
+        return get_executor(pool.get("kind", "thread"), pool.get("workers"))
 
     @cached_property
     def label_font(self) -> ImageFont.FreeTypeFont:
         font = self.config.get("label_font", {"face": platform.DEFAULT_FONT, "size": 20})
-        return self._get_font(font["face"], font["size"])
+        return load_font(font["face"], font["size"])
 
     @cached_property
     def emoji_font(self) -> ImageFont.FreeTypeFont:
         font = self.config.get("emoji_font", {"face": platform.EMOJI_FONT, "size": 109})
-        return self._get_font(font["face"], font["size"])
+        return load_font(font["face"], font["size"])
 
     def load_config(self):
         if not self.config_file_path.is_file():
             log.warning(f"Deck {self.serial_number} has no configuration file ({self.config_file_path}).")
             return
         log.debug(f"Deck {self.serial_number} loaded config from {self.config_file_path}.")
-        config = yaml.safe_load(self.config_file_path.read_text())
-
-        # Support snakedeck format where config is just a list
-        if isinstance(config, list):
-            config = {"keys": config}
+        config = load_config_file(self.config_file_path)
 
         if not config:
             log.warning(f"Deck {self.serial_number} has no configuration in {self.config_file_path!r}.")
             return
 
+        previous: dict = getattr(self, "config", {})
         self.config = config
 
-        for key in self.keys.values():
-            for task in key.tasks:
-                task.cancel("Config reloaded")
-
+        self.writer.configure(**self.config.get("refresh", {}))
+
+        rebuild_all = False
+        for font_setting in ("label_font", "emoji_font"):
+            if previous.get(font_setting) != config.get(font_setting):
+                # Every key might be drawn in this font, so they all need to be redrawn
+                self.__dict__.pop(font_setting, None)
+                rebuild_all = bool(previous)
+
+        if (panel := config.get("panel")) and panel != previous.get("panel"):
+            try:
+                self.set_panel_image(platform.CONFIG_DIR / os.path.expanduser(panel["image"]), gap=panel.get("gap"))
+            except OSError as e:
+                log.warning(f"Deck {self.serial_number} unable to load panel image: {e}")
+        elif not panel and previous.get("panel"):
+            self.panel = None
+            for key_number in range(self.hardware.KEY_COUNT):
+                if key_number not in self.keys:
+                    self.set_key_image(key_number, self.background_frame(key_number))
+
+        key_configs: dict[int, dict] = {}
         for key_config in self.config["keys"]:
             if "line" in key_config and "column" in key_config:
                 # FIXME validate line/column
                 key_number = (key_config["line"] - 1) * self.hardware.KEY_COLS + key_config["column"] - 1
-                key = Key(number=key_number, config=key_config, deck=self)
-                for name in key_config.keys():
-                    if name in {"line", "column"}:
-                        continue
-                    if callback := self.plugin_manager.key_handlers.get(name):
-                        plugin = callback(self, key)
-                        key.handlers.append(plugin)
-                        task = asyncio.get_event_loop().create_task(plugin.loop(), name=f"Key-{key_number}-{name}-handler")
-                        key.add_task(task)
-                    else:
-                        log.warn(f"Unknown display handler {name!r} for key {key_config['line']}-{key_config['column']}")
-                        if log.isEnabledFor(logging.DEBUG):
-                            log.debug("Valid display handlers: %r", list(self.plugin_manager.key_handlers.keys()))
-
-                if old_key := self.keys.get(key_number, None):
-                    for task in old_key.tasks:
-                        task.cancel("Config reload")
-                self.keys[key_number] = key
+                key_configs[key_number] = key_config
             else:
                 if "PATH" in key_config:
                     os.environ["PATH"] = key_config["PATH"] + ":" + os.environ["PATH"]
 
-        log.debug("Reconfigured %s", self.serial_number)
-
-    async def on_keypress(self, hardware, key_number: int, state: bool):
+        # Only tear down the keys that have changed, so the rest keep running (and showing) what they were
+        for key_number, old_key in list(self.keys.items()):
+            if not rebuild_all and key_configs.get(key_number) == old_key.config:
+                continue
+            for task in old_key.tasks:
+                task.cancel("Config reloaded")
+            del self.keys[key_number]
+            if key_number not in key_configs:
+                self.set_key_image(key_number, self.background_frame(key_number))
+
+        built = 0
+        for key_number, key_config in key_configs.items():
+            if key_number in self.keys:
+                continue
+            self.keys[key_number] = self._build_key(key_number, key_config)
+            built += 1
+
+        log.debug("Reconfigured %s, (re)built %d of %d keys", self.serial_number, built, len(self.keys))
+        self.plugin_manager.events.emit("asnakedeck_config_loaded", ConfigLoaded(self, self.config))
+
+    def _build_key(self, key_number: int, key_config: dict) -> Key:
+        key = Key(number=key_number, config=key_config, deck=self)
+        for name in key_config.keys():
+            if name in {"line", "column"}:
+                continue
+            if callback := self.plugin_manager.key_handlers.get(name):
+                plugin = callback(self, key)
+                key.handlers.append(plugin)
+                task = asyncio.get_event_loop().create_task(plugin.loop(), name=f"Key-{key_number}-{name}-handler")
+                key.add_task(task)
+            else:
+                log.warn(f"Unknown display handler {name!r} for key {key_config['line']}-{key_config['column']}")
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Valid display handlers: %r", list(self.plugin_manager.key_handlers.keys()))
+        return key
+
+    async def on_keypress(self, hardware, key_number: int, state: bool, pressed_at: float | None = None):
+        now = time.monotonic()
+        pressed_at = pressed_at or now
+        latency.observe(self.serial_number, key_number, "dispatch", now - pressed_at)
+        self.plugin_manager.events.emit("asnakedeck_key_pressed", KeyPressed(self, key_number, state, pressed_at))
         if key_number not in self.keys:
             return
+        self._pressed_at[key_number] = pressed_at
         pressed_or_released = "pressed" if state else "released"
         func_name = "on_keyup" if state else "on_keydown"
         log.debug(f"Deck {self.serial_number} key {key_number} is now {pressed_or_released}.")
@@ -205,3 +352,4 @@ class Deck:
             await getattr(key, func_name)()
         except Exception as e:
             log.exception(f"Deck {self.serial_number} key {key_number} caused exception {e}:")
+        latency.observe(self.serial_number, key_number, "handled", time.monotonic() - pressed_at)
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import array
+import asyncio
+import bisect
+import functools
+import hashlib
+import itertools
+import json
+import logging
+import mmap
+import os
+from pathlib import Path
+from typing import Any
+
+import attr
+
+from .. import platform
+from ..files import atomic_write_bytes
+from ..rendering import KeyImageFormat, to_native_batch
+from ..types import KeyHandler
+
+log = logging.getLogger(__name__)
+
+DEFAULT_FRAME_DURATION = 100  # ms
+
+# Animations bigger than this (once converted) are kept in a memory-mapped cache file rather than in memory
+MMAP_THRESHOLD = 1024 * 1024
+
+
+@attr.define
+class FrameBuffer:
+    """
+    Native-format frames packed back to back in one buffer.
+
+    The buffer is either ``bytes`` or an ``mmap`` of a cache file, in which case frames are only paged in when they
+    are shown.
+    """
+
+    data: bytes | mmap.mmap = attr.ib(repr=False)
+    offsets: array.array = attr.ib(repr=False)
+    durations: list[float]
+
+    @classmethod
+    def from_frames(cls, frames: list[bytes], durations: list[float]) -> FrameBuffer:
+        offsets = array.array("Q", itertools.accumulate((len(frame) for frame in frames), initial=0))
+        return cls(b"".join(frames), offsets, durations)
+
+    def __len__(self) -> int:
+        return len(self.durations)
+
+    def __getitem__(self, n: int) -> bytes:
+        return self.data[self.offsets[n] : self.offsets[n + 1]]
+
+    def save(self, path: Path) -> None:
+        # The index first, as the frames appearing is what marks the cache as complete
+        atomic_write_bytes(path.with_suffix(".json"), json.dumps({"offsets": self.offsets.tolist(), "durations": self.durations}).encode())
+        atomic_write_bytes(path, bytes(self.data))
+
+    @classmethod
+    def load(cls, path: Path) -> FrameBuffer:
+        index = json.loads(path.with_suffix(".json").read_text())
+        with path.open("rb") as fh:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(data, array.array("Q", index["offsets"]), index["durations"])
+
+
+def decode_animation(key_format: KeyImageFormat, path: Path, columns: int = 1, rows: int = 1, frame_duration: float | None = None) -> FrameBuffer:
+    """
+    Decode every frame of a GIF/APNG, or every cell of a sprite sheet, into the deck's native format.
+
+    Durations are in seconds. This is slow, so is run in the deck's render pool.
+    """
+    from PIL import Image, ImageSequence
+    from StreamDeck.ImageHelpers import PILHelper
+
+    images: list[Image.Image] = []
+    durations: list[float] = []
+
+    def add(image: Image.Image, duration: float):
+        images.append(PILHelper.create_scaled_image(key_format, image, margins=[0, 0, 0, 0]))
+        durations.append(duration / 1000)
+
+    with Image.open(path) as image:
+        if columns > 1 or rows > 1:
+            cell_width, cell_height = image.width // columns, image.height // rows
+            for row, column in itertools.product(range(rows), range(columns)):
+                left, top = column * cell_width, row * cell_height
+                add(image.crop((left, top, left + cell_width, top + cell_height)), frame_duration or DEFAULT_FRAME_DURATION)
+        else:
+            for frame in ImageSequence.Iterator(image):
+                add(frame.convert("RGBA"), frame_duration or frame.info.get("duration") or DEFAULT_FRAME_DURATION)
+
+    return FrameBuffer.from_frames(to_native_batch(key_format, images), durations)
+
+
+class Animation(KeyHandler):
+    """
+    Play an animated GIF/APNG, or a sprite sheet, on a key.
+
+    The config is either the path to the file, or a mapping of ``file`` and optionally ``columns``, ``rows``,
+    ``frame_duration`` (in ms, which overrides any timing in the file) and ``loop`` (defaults to true).
+    """
+
+    @property
+    def settings(self) -> dict[str, Any]:
+        config = self.config["animation"]
+        if isinstance(config, str):
+            config = {"file": config}
+        return config
+
+    @property
+    def path(self) -> Path:
+        return platform.CONFIG_DIR / os.path.expanduser(self.settings["file"])
+
+    def cache_path(self, sheet: dict[str, Any]) -> Path:
+        stat = self.path.stat()
+        key = repr((str(self.path), stat.st_mtime_ns, stat.st_size, self.deck.key_format, sorted(sheet.items())))
+        return platform.STATE_DIR / "animations" / (hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + ".frames")
+
+    async def load(self) -> FrameBuffer:
+        sheet = {k: self.settings[k] for k in ("columns", "rows", "frame_duration") if k in self.settings}
+        cache_path = self.cache_path(sheet)
+        try:
+            return FrameBuffer.load(cache_path)
+        except (OSError, ValueError):
+            pass
+
+        loop = asyncio.get_running_loop()
+        frames = await loop.run_in_executor(self.deck.render_executor, functools.partial(decode_animation, self.deck.key_format, self.path, **sheet))
+        log.debug("Decoded %d frames from %s", len(frames), self.path)
+        if len(frames.data) > MMAP_THRESHOLD:
+            try:
+                frames.save(cache_path)
+                return FrameBuffer.load(cache_path)
+            except OSError as e:
+                log.warning("Unable to cache animation frames in %s: %s", cache_path, e)
+        return frames
+
+    async def loop(self) -> None:
+        frames = await self.load()
+        if not frames:
+            return
+        ends = list(itertools.accumulate(frames.durations))
+        total = ends[-1]
+        repeat = self.settings.get("loop", True)
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        while True:
+            elapsed = loop.time() - start
+            if not repeat and elapsed >= total:
+                self.key.show(frames[len(frames) - 1])
+                return
+            # Work out which frame should be showing now, so if we've fallen behind we skip ahead
+            offset = elapsed % total
+            n = bisect.bisect_right(ends, offset)
+            self.key.show(frames[n])
+            await asyncio.sleep(ends[n] - offset)
@@ -1,14 +1,15 @@
 from __future__ import annotations
 
-import asyncio
 import time
 
+from asnakedeck.ticker import period_for_format, ticks
 from asnakedeck.types import KeyHandler
 
 
 class Clock(KeyHandler):
     async def loop(self) -> None:
         format = self.config["clock"]
-        while True:
-            self.key.update(label=time.strftime(format))
-            await asyncio.sleep(1)
+        await self.key.render_async(label=time.strftime(format))
+        # Only wake up as often as the displayed time can actually change
+        async for _ in ticks(period_for_format(format)):
+            await self.key.render_async(label=time.strftime(format))
@@ -4,6 +4,9 @@ import asyncio
 
 from asnakedeck.types import KeyHandler
 
+# Handlers that draw a single image and never change it
+STATIC_HANDLERS = frozenset({"label", "emoji"})
+
 
 class Cycle(KeyHandler):
     current: int = 0
@@ -11,23 +14,43 @@ class Cycle(KeyHandler):
     restarter: asyncio.Future
     NEXT_CYCLE = object()
 
+    # Pre-rendered images for the states that only use static handlers
+    frames: dict[int, bytes]
+
+    async def prerender(self) -> None:
+        static = {n: state for n, state in enumerate(self.config['cycle']) if state and STATIC_HANDLERS.issuperset(state)}
+        images = await asyncio.gather(*(self.key.prerender(**state) for state in static.values()))
+        self.frames = {n: image for n, image in zip(static, images) if image is not None}
+
     async def loop(self) -> None:
+        self.restarter = asyncio.get_event_loop().create_future()
+        await self.prerender()
         while True:
-            self.restarter = asyncio.get_event_loop().create_future()
+            if self.restarter.done():
+                self.restarter = asyncio.get_event_loop().create_future()
+            if (frame := self.frames.get(self.current)) is not None:
+                # Nothing to run, just show it and wait for the next press
+                self.key.show(frame)
+                await self.restarter
+                continue
+
             current_config = self.key.config['cycle'][self.current]
             tasks = []
             for name in current_config.keys():
                 callback = self.deck.plugin_manager.key_handlers[name]
                 plugin = callback(deck=self.deck, key=self.key, config=current_config)
-                tasks.append(asyncio.create_task(plugin.loop()))
-            for coro in asyncio.as_completed([self.restarter] + tasks):  # type: ignore
-                await coro
-                if coro is self.restarter:
-                    # Cancel any tasks from the previous key handler
-                    for task in tasks:
-                        task.cancel()
-                    break
+                tasks.append(asyncio.create_task(plugin.loop(), name=f"Key-{self.key.number}-cycle-{name}-handler"))
+            pending = {self.restarter, *tasks}
+            while not self.restarter.done():
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done - {self.restarter}:
+                    # Handlers that just draw once finish straight away, but don't hide any that failed
+                    task.result()
+            # Cancel any tasks from the previous key handler
+            for task in tasks:
+                task.cancel()
 
     async def on_keydown(self):
         self.current = (self.current + 1) % len(self.config['cycle'])
-        self.restarter.set_result(self.NEXT_CYCLE)
+        if not self.restarter.done():
+            self.restarter.set_result(self.NEXT_CYCLE)
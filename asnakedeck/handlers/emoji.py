@@ -5,4 +5,4 @@ from asnakedeck.types import KeyHandler
 
 class Emoji(KeyHandler):
     async def loop(self) -> None:
-        self.key.update(emoji=self.config['emoji'])
+        await self.key.render_async(emoji=self.config['emoji'])
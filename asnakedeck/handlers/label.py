@@ -5,4 +5,4 @@ from asnakedeck.types import KeyHandler
 
 class Label(KeyHandler):
     async def loop(self) -> None:
-        self.key.update(label=self.config['label'])
+        await self.key.render_async(label=self.config['label'])
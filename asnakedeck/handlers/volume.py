@@ -37,10 +37,10 @@ class Volume(KeyHandler):
         if volume:
             # Show the volume percentag for a split-second
             logging.debug(f'Showing level {volume}')
-            self.key.update(label=f'{volume:.0%}')
+            await self.key.render_async(label=f'{volume:.0%}')
             await asyncio.sleep(0.33)
             logging.debug(f'Showing level {volume} - Done')
-        self.key.update(emoji=emoji)
+        await self.key.render_async(emoji=emoji)
         self.task = None
 
     async def on_volume_change(self, volume: float):
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+import attr
+
+if TYPE_CHECKING:
+    import pluggy
+
+    from .deck import Deck
+
+log = logging.getLogger(__name__)
+
+
+@attr.frozen
+class ConfigLoaded:
+    deck: Deck
+    config: dict[str, Any]
+
+
+@attr.frozen
+class KeyPressed:
+    deck: Deck
+    key_number: int
+    pressed: bool
+    timestamp: float = attr.Factory(time.monotonic)
+
+
+@attr.frozen
+class FrameRendered:
+    deck: Deck
+    key_number: int
+    image: bytes = attr.ib(repr=False)
+    timestamp: float = attr.Factory(time.monotonic)
+
+
+@attr.define
+class HookDispatcher:
+    """
+    Collects events and calls the matching hooks once per event loop iteration.
+
+    Events for hooks that no plugin implements are dropped straight away, so emitting them is almost free.
+    """
+
+    hook: pluggy.HookRelay
+    pending: dict[str, list[Any]] = attr.Factory(dict)
+    _flush_scheduled: bool = False
+
+    def emit(self, hook_name: str, event: Any) -> None:
+        if not getattr(self.hook, hook_name).get_hookimpls():
+            return
+        self.pending.setdefault(hook_name, []).append(event)
+        if not self._flush_scheduled:
+            try:
+                asyncio.get_running_loop().call_soon(self.flush)
+            except RuntimeError:
+                # No loop (e.g. at shutdown) so deliver straight away
+                self.flush()
+                return
+            self._flush_scheduled = True
+
+    def flush(self) -> None:
+        self._flush_scheduled = False
+        pending, self.pending = self.pending, {}
+        for hook_name, events in pending.items():
+            try:
+                getattr(self.hook, hook_name)(events=events)
+            except Exception:
+                log.exception("Error calling %s hook", hook_name)
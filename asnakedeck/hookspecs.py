@@ -0,0 +1,47 @@
+"""
+Hooks that plugins can implement to observe what asnakedeck is doing.
+
+Events are delivered in batches: each hook is called at most once per event loop iteration, with every event of
+that kind that happened since the last call. Implement a hook by decorating a function with
+:data:`asnakedeck.hookimpl` and registering the module under the ``asnakedeck.plugin`` entrypoint group, e.g.::
+
+    asnakedeck.plugin =
+        my_plugin = my_package.my_module
+"""
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
+
+import pluggy
+
+if TYPE_CHECKING:
+    from .deck import Deck
+    from .hooks import ConfigLoaded, FrameRendered, KeyPressed
+
+hookspec = pluggy.HookspecMarker("asnakedeck")
+
+
+@hookspec
+def asnakedeck_deck_added(events: Sequence[Deck]) -> None:
+    """Decks have been connected and configured"""
+
+
+@hookspec
+def asnakedeck_deck_removed(events: Sequence[Deck]) -> None:
+    """Decks have been closed"""
+
+
+@hookspec
+def asnakedeck_config_loaded(events: Sequence[ConfigLoaded]) -> None:
+    """Decks have (re)loaded their config files"""
+
+
+@hookspec
+def asnakedeck_key_pressed(events: Sequence[KeyPressed]) -> None:
+    """Keys have been pressed or released"""
+
+
+@hookspec
+def asnakedeck_frame_rendered(events: Sequence[FrameRendered]) -> None:
+    """New images have been queued to be shown on keys"""
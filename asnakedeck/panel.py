@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING
+
+import attr
+
+from .rendering import to_native_batch
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+    from .rendering import KeyImageFormat
+
+# Roughly how wide the bezel between two keys is, measured in key pixels
+DEFAULT_GAP = 16
+
+
+@attr.define
+class Panel:
+    """
+    Splits one image across every key of a deck.
+
+    The image is scaled once to the size of the whole key grid, including the gaps between keys (which are cropped
+    away so the picture lines up across the bezels) and then sliced into one native-format frame per key. The last
+    frame for each key is remembered, so if only part of the image changes only those tiles are re-encoded.
+    """
+
+    key_format: KeyImageFormat
+    cols: int
+    rows: int
+    gap: int = DEFAULT_GAP
+    # Key number -> (digest of the raw tile, native frame)
+    tiles: dict[int, tuple[bytes, bytes]] = attr.ib(factory=dict, repr=False)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        width, height = self.key_format.size
+        return (self.cols * width + (self.cols - 1) * self.gap, self.rows * height + (self.rows - 1) * self.gap)
+
+    def slice(self, image: Image.Image) -> dict[int, bytes]:
+        """Get the native frame for each key for this image"""
+        from PIL import ImageOps
+
+        width, height = self.key_format.size
+        # Scale (and crop to the right aspect ratio) once for the whole grid
+        full = ImageOps.fit(image.convert("RGB"), self.size)
+
+        changed = {}
+        for row in range(self.rows):
+            for col in range(self.cols):
+                key_number = row * self.cols + col
+                left, top = col * (width + self.gap), row * (height + self.gap)
+                tile = full.crop((left, top, left + width, top + height))
+                digest = hashlib.blake2b(tile.tobytes(), digest_size=16).digest()
+                if (cached := self.tiles.get(key_number)) and cached[0] == digest:
+                    continue
+                changed[key_number] = (digest, tile)
+
+        # Convert all the changed tiles in one go
+        frames = to_native_batch(self.key_format, [tile for _, tile in changed.values()])
+        for (key_number, (digest, _)), frame in zip(changed.items(), frames):
+            self.tiles[key_number] = (digest, frame)
+
+        return {key_number: frame for key_number, (_, frame) in self.tiles.items()}
+
+    def frame_for(self, key_number: int) -> bytes | None:
+        if tile := self.tiles.get(key_number):
+            return tile[1]
+        return None
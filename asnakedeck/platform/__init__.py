@@ -9,6 +9,7 @@ if TYPE_CHECKING:
     from pathlib import Path
 
     CONFIG_DIR: Path
+    STATE_DIR: Path
     EMOJI_FONT: str
     DEFAULT_FONT: str
 
@@ -19,7 +20,7 @@ if TYPE_CHECKING:
 
     AudioVolumeWatcher: Type[AudioVolumeWatcherInterface]
 
-__all__ = ["WINDOWS", "CONFIG_DIR", "EMOJI_FONT"]
+__all__ = ["WINDOWS", "CONFIG_DIR", "STATE_DIR", "EMOJI_FONT"]
 
 if WINDOWS:
     from . import win32 as impl
@@ -41,6 +42,17 @@ def __getattr__(name) -> Any:
                 val = XDG_CONFIG_HOME / "snakedeck"
             globals()[name] = val
             return val
+        case "STATE_DIR":
+            if WINDOWS:
+                from .win32 import get_win_folder
+
+                val = get_win_folder("CSIDL_LOCAL_APPDATA") / "snakedeck" / "state"
+            else:
+                from .linux import XDG_STATE_HOME
+
+                val = XDG_STATE_HOME / "snakedeck"
+            globals()[name] = val
+            return val
         case "AudioVolumeWatcher":
             if WINDOWS:
                 from .win32.audio import WindowsVolumeWatcher
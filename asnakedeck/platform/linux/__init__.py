@@ -1,11 +1,9 @@
 from __future__ import annotations
 
-import asyncio
-import os
 import logging
-from collections.abc import Coroutine
+import os
 from pathlib import Path
-from typing import Callable
+from typing import Any
 
 log = logging.getLogger(__name__)
 
@@ -24,44 +22,10 @@ def resolve_font(name: str) -> str:
     return name
 
 
-async def watch_file_for_changes(path: Path, cb: Callable[[os.PathLike], Coroutine]):
-    """
-    Watch a file for changes, and call the async callback when detected.
-
-    This will also watch the parent directory to catch the case where editors move a new file in to place over
-    the top. (Which is how many editors save changes so that the update is "atomic")
-    """
-    from asyncinotify import Inotify, InotifyError, Mask
-
-    def _add_file_watch():
-        try:
-            inotify.add_watch(path, Mask.MODIFY)
-        except InotifyError:
-            pass
-
-    try:
-        inotify = Inotify()
-
-        _add_file_watch()
-        # Watch the dir for files for file being moved in place (which is what editors usually do)
-        inotify.add_watch(path.parent, Mask.MOVE | Mask.CREATE)
-
-        async for event in inotify:
-            if event.mask & (Mask.CREATE | Mask.MOVED_TO):
-                assert event.name
-                assert event.watch
-                # File created/renamed in config directory
-                full_path = event.watch.path / event.name
-                if full_path == path:
-                    await cb(path)
-                    _add_file_watch()
-
-            elif event.mask & Mask.MODIFY:
-                # File was modified
-                await cb(path)
-    except asyncio.CancelledError:
-        pass
-
-
+def __getattr__(name: str) -> Any:
+    # The watcher pulls in asyncio and attrs, which most CLI commands don't need
+    if name in {"DirectoryWatcher", "shared_directory_watcher"}:
+        from . import watcher
 
-if pulsectl:
+        return getattr(watcher, name)
+    raise AttributeError(f"module {__name__} has no attribute {name}")
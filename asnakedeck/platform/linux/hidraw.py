@@ -0,0 +1,148 @@
+"""
+A StreamDeck transport that talks to the kernel's hidraw device nodes directly.
+
+Unlike the library's hidapi transport this gives us a file descriptor for each deck, so key reports can be read by
+the event loop (see :mod:`asnakedeck.reader`) instead of by a thread polling the device.
+"""
+from __future__ import annotations
+
+import fcntl
+import os
+import threading
+from pathlib import Path
+
+from StreamDeck.Transport.Transport import Transport, TransportError
+
+SYSFS_HIDRAW = Path("/sys/class/hidraw")
+
+
+def _ioc_readwrite(number: int, size: int) -> int:
+    # _IOC(_IOC_WRITE|_IOC_READ, 'H', number, size) from <linux/hidraw.h>
+    return (3 << 30) | (size << 16) | (ord("H") << 8) | number
+
+
+def HIDIOCSFEATURE(size: int) -> int:
+    return _ioc_readwrite(0x06, size)
+
+
+def HIDIOCGFEATURE(size: int) -> int:
+    return _ioc_readwrite(0x07, size)
+
+
+def _hid_ids(node: Path) -> tuple[int, int] | None:
+    try:
+        uevent = (node / "device" / "uevent").read_text()
+    except OSError:
+        return None
+    for line in uevent.splitlines():
+        if line.startswith("HID_ID="):
+            # HID_ID=0003:00000FD9:00000080 -- bus, vendor, product
+            _, vendor, product = line[len("HID_ID=") :].split(":")
+            return int(vendor, 16), int(product, 16)
+    return None
+
+
+class HidrawTransport(Transport):
+    class Device(Transport.Device):
+        def __init__(self, path: str, vendor_id: int, product_id: int):
+            self._path = path
+            self._vendor_id = vendor_id
+            self._product_id = product_id
+            self.fd: int | None = None
+            # Writes come from the deck's writer thread, everything else from the loop
+            self.mutex = threading.Lock()
+
+        def open(self):
+            with self.mutex:
+                if self.fd is not None:
+                    return
+                try:
+                    self.fd = os.open(self._path, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+                except OSError as e:
+                    raise TransportError(f"Unable to open {self._path}: {e}") from e
+
+        def close(self):
+            with self.mutex:
+                if self.fd is not None:
+                    os.close(self.fd)
+                    self.fd = None
+
+        def is_open(self):
+            return self.fd is not None
+
+        def connected(self):
+            return os.path.exists(self._path)
+
+        def path(self):
+            return self._path
+
+        def vendor_id(self):
+            return self._vendor_id
+
+        def product_id(self):
+            return self._product_id
+
+        def fileno(self) -> int:
+            if self.fd is None:
+                raise TransportError("No HID device.")
+            return self.fd
+
+        def write_feature(self, payload):
+            buf = bytearray(payload)
+            with self.mutex:
+                try:
+                    return fcntl.ioctl(self.fileno(), HIDIOCSFEATURE(len(buf)), buf)
+                except OSError as e:
+                    raise TransportError(f"Failed to write feature report: {e}") from e
+
+        def read_feature(self, report_id, length):
+            buf = bytearray(length)
+            buf[0] = report_id
+            with self.mutex:
+                try:
+                    result = fcntl.ioctl(self.fileno(), HIDIOCGFEATURE(length), buf)
+                except OSError as e:
+                    raise TransportError(f"Failed to read feature report: {e}") from e
+            return bytes(buf[:result])
+
+        def write(self, payload):
+            with self.mutex:
+                try:
+                    return os.write(self.fileno(), bytes(payload))
+                except OSError as e:
+                    raise TransportError(f"Failed to write out report: {e}") from e
+
+        def read(self, length):
+            try:
+                data = os.read(self.fileno(), length)
+            except BlockingIOError:
+                return None
+            except OSError as e:
+                raise TransportError(f"Failed to read in report: {e}") from e
+            if not data:
+                # The device has gone away
+                raise TransportError("Failed to read in report: device disconnected")
+            return data
+
+    @staticmethod
+    def probe():
+        if not SYSFS_HIDRAW.is_dir():
+            raise TransportError("No hidraw support in this kernel")
+
+    def enumerate(self, vid, pid):
+        devices = []
+        for node in sorted(SYSFS_HIDRAW.iterdir()):
+            if _hid_ids(node) == (vid, pid):
+                devices.append(self.Device(f"/dev/{node.name}", vid, pid))
+        return devices
+
+
+def enumerate_decks() -> list:
+    """Find the StreamDecks that can be opened through hidraw"""
+    from StreamDeck.DeviceManager import DeviceManager
+
+    HidrawTransport.probe()
+    # Borrow the library's mapping of product IDs to deck classes
+    manager = DeviceManager(transport="dummy")
+    manager.transport = HidrawTransport()
+    return [deck for deck in manager.enumerate() if os.access(deck.id(), os.R_OK | os.W_OK)]
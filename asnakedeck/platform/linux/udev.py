@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import socket
+from collections.abc import AsyncIterator
+
+from ...supervisor import DeviceEvent
+
+log = logging.getLogger(__name__)
+
+NETLINK_KOBJECT_UEVENT = 15
+# The multicast group the kernel sends uevents to (udev re-broadcasts them, in its own format, on group 2)
+KERNEL_UEVENT_GROUP = 1
+
+
+def parse_uevent(message: bytes) -> dict[str, str]:
+    # "add@/devices/...\0ACTION=add\0DEVPATH=/devices/...\0SUBSYSTEM=hidraw\0..."
+    _, *fields = message.split(b"\0")
+    return dict(field.decode(errors="replace").partition("=")[::2] for field in fields if b"=" in field)
+
+
+class UdevEventSource:
+    """
+    Report hidraw devices being plugged in and unplugged, from the kernel's uevent netlink socket.
+
+    This needs neither libudev nor any special privileges. The events arrive before udev has finished setting the
+    device node up, so consumers should give it a moment before opening the device.
+    """
+
+    subsystem = "hidraw"
+
+    async def events(self) -> AsyncIterator[DeviceEvent]:
+        loop = asyncio.get_running_loop()
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_NONBLOCK, NETLINK_KOBJECT_UEVENT) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+            sock.bind((0, KERNEL_UEVENT_GROUP))
+            while True:
+                uevent = parse_uevent(await loop.sock_recv(sock, 8192))
+                if uevent.get("SUBSYSTEM") != self.subsystem or uevent.get("ACTION") not in {"add", "remove"}:
+                    continue
+                log.debug("%s %s", uevent["ACTION"], uevent.get("DEVNAME") or uevent.get("DEVPATH"))
+                yield DeviceEvent(uevent["ACTION"], uevent.get("DEVPATH", ""))
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+from collections.abc import Coroutine
+from pathlib import Path
+from typing import Callable
+
+import attr
+
+log = logging.getLogger(__name__)
+
+DEBOUNCE_DELAY = 0.25
+
+
+def _content_hash(path: Path) -> bytes | None:
+    try:
+        return hashlib.blake2b(path.read_bytes(), digest_size=16).digest()
+    except OSError:
+        return None
+
+
+@attr.define
+class DirectoryWatcher:
+    """
+    Watch the files in a directory with a single inotify instance, and call the async callback subscribed to a file
+    name when that file changes.
+
+    Watching the directory rather than the files themselves also catches editors moving a new file in to place over
+    the top (which is how many editors save changes so that the update is "atomic") and files that don't exist yet.
+
+    Editors often produce several events for a single save, so a callback is only called once no more events for
+    its file have arrived for ``debounce`` seconds, and then only if the contents of the file have actually changed.
+    """
+
+    directory: Path
+    debounce: float = DEBOUNCE_DELAY
+    subscribers: dict[str, Callable[[os.PathLike], Coroutine]] = attr.Factory(dict)
+    task: asyncio.Task | None = None
+
+    _hashes: dict[str, bytes | None] = attr.ib(factory=dict, repr=False)
+    _timers: dict[str, asyncio.TimerHandle] = attr.ib(factory=dict, repr=False)
+    _coalesced: dict[str, int] = attr.ib(factory=dict, repr=False)
+    _callbacks: set[asyncio.Task] = attr.ib(factory=set, repr=False)
+
+    def subscribe(self, name: str, cb: Callable[[os.PathLike], Coroutine]) -> asyncio.Task:
+        """Call ``cb`` when the file ``name`` in the directory changes, starting the watcher if needed"""
+        self.subscribers[name] = cb
+        self._hashes[name] = _content_hash(self.directory / name)
+        if not self.task or self.task.done():
+            self.task = asyncio.create_task(self.run(), name=f"watcher-{self.directory}")
+        return self.task
+
+    def unsubscribe(self, name: str) -> None:
+        self.subscribers.pop(name, None)
+        self._hashes.pop(name, None)
+        if timer := self._timers.pop(name, None):
+            timer.cancel()
+        if not self.subscribers and self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self) -> None:
+        from asyncinotify import Inotify, Mask
+
+        try:
+            with Inotify() as inotify:
+                inotify.add_watch(self.directory, Mask.MODIFY | Mask.MOVED_TO | Mask.CREATE)
+
+                async for event in inotify:
+                    if not event.name:
+                        continue
+                    name = str(event.name)
+                    if name in self.subscribers:
+                        self._schedule(name)
+                    elif event.mask & (Mask.CREATE | Mask.MOVED_TO):
+                        log.debug("%s appeared in %s, but nothing is interested in it", name, self.directory)
+        except asyncio.CancelledError:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+
+    def _schedule(self, name: str) -> None:
+        if timer := self._timers.get(name):
+            timer.cancel()
+            self._coalesced[name] = self._coalesced.get(name, 0) + 1
+        self._timers[name] = asyncio.get_running_loop().call_later(self.debounce, self._fire, name)
+
+    def _fire(self, name: str) -> None:
+        self._timers.pop(name, None)
+        task = asyncio.create_task(self._changed(name), name=f"file-changed-{name}")
+        self._callbacks.add(task)
+        task.add_done_callback(functools.partial(self._on_callback_done, name))
+
+    def _on_callback_done(self, name: str, task: asyncio.Task) -> None:
+        self._callbacks.discard(task)
+        if not task.cancelled() and (exc := task.exception()):
+            log.error("Error handling change to %s", self.directory / name, exc_info=exc)
+
+    async def _changed(self, name: str) -> None:
+        path = self.directory / name
+        if coalesced := self._coalesced.pop(name, 0):
+            log.debug("Coalesced %d change events for %s", coalesced, path)
+        new_hash = _content_hash(path)
+        if new_hash == self._hashes.get(name):
+            log.debug("Contents of %s unchanged, not reloading", path)
+            return
+        self._hashes[name] = new_hash
+        if cb := self.subscribers.get(name):
+            await cb(path)
+
+
+_shared_watchers: dict[Path, DirectoryWatcher] = {}
+
+
+def shared_directory_watcher(directory: Path, debounce: float | None = None) -> DirectoryWatcher:
+    """
+    Get the process-wide watcher for ``directory``, so that everything watching it shares one inotify instance.
+
+    If ``debounce`` is given the watcher uses it from now on, whoever created it.
+    """
+    try:
+        watcher = _shared_watchers[directory]
+    except KeyError:
+        watcher = _shared_watchers.setdefault(directory, DirectoryWatcher(directory))
+    if debounce is not None:
+        watcher.debounce = debounce
+    return watcher
@@ -1,16 +1,26 @@
 from __future__ import annotations
 
+import hashlib
 import importlib.metadata
+import json
 import logging
+import os
+import sys
 from collections import defaultdict
 from collections.abc import Mapping
 from functools import cached_property
+from pathlib import Path
 from types import FunctionType
 from typing import TYPE_CHECKING, Callable, Generic, TypeVar
 
 import attr
 
+from .files import atomic_write_bytes
+
 if TYPE_CHECKING:
+    import pluggy
+
+    from .hooks import HookDispatcher
     from .types import KeyHandler
 
 T = TypeVar("T", Callable, FunctionType)
@@ -86,8 +96,34 @@ class PluginManager:
         # Only load entrypoints on demand.
         return self.LazyPluginDict(self, "key_handler")  # type: ignore
 
+    @cached_property
+    def hooks(self) -> pluggy.PluginManager:
+        """The pluggy manager for plugins registered under the ``asnakedeck.plugin`` entrypoint group"""
+        import pluggy
+
+        from . import hookspecs
+
+        pm = pluggy.PluginManager("asnakedeck")
+        pm.add_hookspecs(hookspecs)
+        for name, ep in self.setuptools_entrypoints.get("plugin", {}).items():
+            logging.info("Loading plugin %r", name)
+            pm.register(ep.load(), name=name)
+        return pm
+
+    @cached_property
+    def events(self) -> HookDispatcher:
+        from .hooks import HookDispatcher
+
+        return HookDispatcher(self.hooks.hook)
+
     @cached_property
     def setuptools_entrypoints(self) -> dict[str, dict[str, importlib.metadata.EntryPoint]]:
+        if (eps := self.load_entrypoint_index()) is None:
+            eps = self.rebuild_entrypoint_index()
+        return eps
+
+    @staticmethod
+    def scan_entrypoints() -> dict[str, dict[str, importlib.metadata.EntryPoint]]:
         eps: dict[str, dict[str, importlib.metadata.EntryPoint]] = defaultdict(dict)
         for dist in list(importlib.metadata.distributions()):
             for ep in dist.entry_points:
@@ -96,3 +132,64 @@ class PluginManager:
                 _, kind = ep.group.split(".", 1)
                 eps[kind][ep.name] = ep
         return eps
+
+    @staticmethod
+    def path_fingerprint() -> str:
+        """
+        A fingerprint of everything that could change which plugins are installed.
+
+        Installing or removing a distribution adds or removes its metadata directory, which changes the mtime of
+        the ``sys.path`` entry it is in. The current directory is left out: files come and go there all the time, and
+        where we happen to be started from shouldn't invalidate the index.
+        """
+        cwd = os.getcwd()
+        entries = []
+        for entry in sys.path:
+            if not entry or os.path.abspath(entry) == cwd:
+                continue
+            try:
+                mtime = os.stat(entry).st_mtime_ns
+            except OSError:
+                mtime = None
+            entries.append((entry, mtime))
+        return hashlib.blake2b(json.dumps([sys.version, entries]).encode(), digest_size=16).hexdigest()
+
+    @cached_property
+    def entrypoint_index_path(self) -> Path:
+        from . import platform
+
+        # One per environment, so switching between virtualenvs or interpreters doesn't keep invalidating it
+        environment = hashlib.blake2b(f"{sys.prefix}\0{sys.executable}".encode(), digest_size=8).hexdigest()
+        return platform.STATE_DIR / f"entrypoints-{environment}.json"
+
+    def load_entrypoint_index(self) -> dict[str, dict[str, importlib.metadata.EntryPoint]] | None:
+        """Load the entrypoints from the on-disk index, unless it is missing or out of date"""
+        try:
+            index = json.loads(self.entrypoint_index_path.read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.debug("Ignoring unreadable plugin index %s: %s", self.entrypoint_index_path, e)
+            return None
+        if index.get("fingerprint") != self.path_fingerprint():
+            logging.debug("Plugin index %s is out of date", self.entrypoint_index_path)
+            return None
+        eps: dict[str, dict[str, importlib.metadata.EntryPoint]] = defaultdict(dict)
+        for kind, entries in index["entrypoints"].items():
+            for name, (value, group) in entries.items():
+                eps[kind][name] = importlib.metadata.EntryPoint(name, value, group)
+        return eps
+
+    def rebuild_entrypoint_index(self) -> dict[str, dict[str, importlib.metadata.EntryPoint]]:
+        """Scan all installed distributions for entrypoints, and save the result to the on-disk index"""
+        eps = self.scan_entrypoints()
+        index = {
+            "fingerprint": self.path_fingerprint(),
+            "entrypoints": {kind: {name: (ep.value, ep.group) for name, ep in entries.items()} for kind, entries in eps.items()},
+        }
+        try:
+            atomic_write_bytes(self.entrypoint_index_path, json.dumps(index, indent=2).encode())
+        except OSError as e:
+            logging.warning("Unable to write plugin index %s: %s", self.entrypoint_index_path, e)
+        self.__dict__["setuptools_entrypoints"] = eps
+        return eps
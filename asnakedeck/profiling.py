@@ -0,0 +1,43 @@
+"""
+Timing of the phases of startup, reported by ``asnakedeck --profile-startup``.
+
+This is imported first thing by the CLI, so it must not import anything heavy itself.
+"""
+from __future__ import annotations
+
+import sys
+import time
+
+_start = time.perf_counter()
+_last = _start
+_last_module_count = len(sys.modules)
+phases: list[tuple[str, float, int]] = []
+
+# Decided before the arguments are parsed, so that the phases before that are recorded too
+enabled = "--profile-startup" in sys.argv[1:]
+_reported = False
+
+
+def mark(name: str) -> None:
+    """Record that the phase ``name`` has just finished. Does nothing unless profiling, or once the report is out"""
+    global _last, _last_module_count
+    if not enabled or _reported:
+        return
+    now = time.perf_counter()
+    module_count = len(sys.modules)
+    phases.append((name, now - _last, module_count - _last_module_count))
+    _last = now
+    _last_module_count = module_count
+
+
+def report(file=None) -> None:
+    """Print the time taken by each phase, if profiling was asked for. Only the first call prints anything."""
+    global _reported
+    if not enabled or _reported:
+        return
+    _reported = True
+    file = file or sys.stderr
+    print(f"{'phase':<40} {'ms':>9} {'modules':>8}", file=file)
+    for name, duration, modules in phases:
+        print(f"{name:<40} {duration * 1000:>9.1f} {modules:>8}", file=file)
+    print(f"{'total':<40} {(_last - _start) * 1000:>9.1f} {len(sys.modules):>8}", file=file)
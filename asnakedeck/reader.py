@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable, Coroutine
+from typing import TYPE_CHECKING, Any
+
+import attr
+from StreamDeck.Transport.Transport import TransportError
+
+if TYPE_CHECKING:
+    from StreamDeck.Devices.StreamDeck import StreamDeck
+
+log = logging.getLogger(__name__)
+
+
+@attr.define
+class KeyReader:
+    """
+    Read key reports from the event loop, for decks whose transport has a file descriptor.
+
+    This replaces the StreamDeck library's read thread: rather than polling the device the loop is woken up when a
+    report arrives, and the callback is run straight away without hopping between threads.
+    """
+
+    hardware: StreamDeck
+    # Called with the deck, key number, new state and the time the report was read
+    callback: Callable[[StreamDeck, int, bool, float], Coroutine[Any, Any, None]]
+    fd: int | None = attr.ib(default=None, repr=False)
+    loop: asyncio.AbstractEventLoop | None = attr.ib(default=None, repr=False)
+    tasks: set[asyncio.Task] = attr.ib(factory=set, repr=False)
+
+    @staticmethod
+    def supported(hardware: StreamDeck) -> bool:
+        return hasattr(hardware.device, "fileno")
+
+    def start(self) -> None:
+        fd = self.fd = self.hardware.device.fileno()
+        loop = self.loop = asyncio.get_running_loop()
+        loop.add_reader(fd, self._on_readable)
+
+    def stop(self) -> None:
+        if self.loop and self.fd is not None:
+            self.loop.remove_reader(self.fd)
+        self.fd = None
+
+    def _on_readable(self) -> None:
+        hardware = self.hardware
+        # Only ever called by the loop that start() registered us with
+        loop = self.loop
+        assert loop
+        try:
+            # Drain everything that has arrived, each read is one report
+            while (states := hardware._read_key_states()) is not None:
+                now = time.monotonic()
+                for key_number, (old, new) in enumerate(zip(hardware.last_key_states, states)):
+                    if old != new:
+                        task = loop.create_task(self.callback(hardware, key_number, new, now))
+                        self.tasks.add(task)
+                        task.add_done_callback(self.tasks.discard)
+                hardware.last_key_states = states
+        except TransportError as e:
+            # Same as the library's read thread: the device has gone, so close it
+            log.warning("Error reading from deck %s: %s", hardware.id(), e)
+            self.stop()
+            hardware.close()
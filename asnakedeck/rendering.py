@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import io
+import weakref
+from collections import OrderedDict
+from collections.abc import Hashable, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+import attr
+
+if TYPE_CHECKING:
+    from PIL import Image, ImageFont
+    from StreamDeck.Devices.StreamDeck import StreamDeck
+
+    from .text import TextRaster
+
+
+# Number of rendered key images kept per deck model
+IMAGE_CACHE_SIZE = 512
+
+DEFAULT_MARGINS = (4, 4, 4, 4)
+
+# Gap between the lines of a wrapped label
+LINE_SPACING = 2
+
+
+@attr.frozen
+class KeyImageFormat:
+    """
+    The properties of a StreamDeck model that affect how a key image is rendered.
+
+    This quacks enough like a ``StreamDeck`` for ``PILHelper`` to use it, but unlike the hardware object it is
+    hashable, so it can be used to pick the image cache that is shared between decks of the same model.
+    """
+
+    deck_type: str
+    size: tuple[int, int]
+    format: str
+    flip: tuple[bool, bool]
+    rotation: int
+
+    @classmethod
+    def from_hardware(cls, hardware: StreamDeck) -> KeyImageFormat:
+        image_format = hardware.key_image_format()
+        return cls(
+            deck_type=hardware.deck_type(),
+            size=tuple(image_format["size"]),  # type: ignore[arg-type]
+            format=image_format["format"],
+            flip=tuple(image_format["flip"]),  # type: ignore[arg-type]
+            rotation=image_format["rotation"],
+        )
+
+    def key_image_format(self) -> dict[str, Any]:
+        return {"size": self.size, "format": self.format, "flip": self.flip, "rotation": self.rotation}
+
+
+@attr.define
+class ImageCache:
+    """A bounded LRU cache of native-format key images"""
+
+    maxsize: int = IMAGE_CACHE_SIZE
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: OrderedDict[Hashable, bytes] = attr.ib(factory=OrderedDict, repr=False)
+
+    def get(self, key: Hashable) -> bytes | None:
+        try:
+            image = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return image
+
+    def put(self, key: Hashable, image: bytes) -> None:
+        self.entries[key] = image
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+_image_caches: dict[KeyImageFormat, ImageCache] = {}
+
+
+def image_cache_for(key_format: KeyImageFormat) -> ImageCache:
+    """Get the image cache shared by all decks of this model"""
+    try:
+        return _image_caches[key_format]
+    except KeyError:
+        return _image_caches.setdefault(key_format, ImageCache())
+
+
+def render_text(
+    key_format: KeyImageFormat,
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    margins: tuple[int, int, int, int] = DEFAULT_MARGINS,
+    **kwargs,
+) -> bytes:
+    """
+    Draw ``text`` and convert it to the native image format for the deck, bypassing any cache.
+
+    With ``wrap=True`` the text is wrapped (and shrunk if need be) to fit inside the margins, and each line is aligned
+    according to ``align``: ``left``, ``center`` or ``right``.
+    """
+    from PIL import Image
+    from StreamDeck.ImageHelpers import PILHelper
+
+    from .text import get_text_raster, layout_text
+
+    fill = kwargs.pop("fill", "white")
+    wrap = kwargs.pop("wrap", False)
+    align = kwargs.pop("align", "center")
+    if kwargs.get("embedded_color"):
+        # Non-colour glyphs in a colour font still need to be drawn in the fill colour
+        kwargs["fill"] = fill
+
+    if wrap:
+        top, right, bottom, left = margins
+        width, height = key_format.size
+        layout = layout_text(font, text, (width - left - right, height - top - bottom))
+        image = Image.new("RGB", layout.size)
+        for n, line in enumerate(layout.lines):
+            raster = get_text_raster(layout.font, line, **kwargs)
+            x = {"left": 0, "right": layout.size[0] - raster.size[0]}.get(align, (layout.size[0] - raster.size[0]) // 2)
+            _paste_raster(image, raster, fill, (x, n * (layout.line_height + LINE_SPACING)))
+    else:
+        raster = get_text_raster(font, text, **kwargs)
+        image = Image.new("RGB", raster.size)
+        _paste_raster(image, raster, fill, (0, 0))
+
+    scaled_image = PILHelper.create_scaled_image(key_format, image, margins=list(margins))
+    return bytes(PILHelper.to_native_format(key_format, scaled_image))
+
+
+def _paste_raster(image: Image.Image, raster: TextRaster, fill: Any, position: tuple[int, int]) -> None:
+    if raster.image.mode == "RGB":
+        image.paste(raster.image, position)
+    else:
+        image.paste(fill, (*position, position[0] + raster.size[0], position[1] + raster.size[1]), mask=raster.image)
+
+
+def text_cache_key(text: str, font: ImageFont.FreeTypeFont, margins: tuple[int, int, int, int], kwargs: dict[str, Any]) -> Hashable:
+    return (text, font.path, font.index, font.size, margins, tuple(sorted(kwargs.items())))
+
+
+def get_text_image(
+    key_format: KeyImageFormat,
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    margins: tuple[int, int, int, int] = DEFAULT_MARGINS,
+    **kwargs,
+) -> bytes:
+    """Like :func:`render_text`, but return a cached image if this exact text has been rendered for this deck model"""
+    cache = image_cache_for(key_format)
+    cache_key = text_cache_key(text, font, margins, kwargs)
+    if (image := cache.get(cache_key)) is None:
+        image = render_text(key_format, text, font, margins, **kwargs)
+        cache.put(cache_key, image)
+    return image
+
+
+_executors: dict[tuple[str, int | None], Executor] = {}
+
+
+def get_executor(kind: str = "thread", workers: int | None = None) -> Executor:
+    """
+    Get the pool that key images are rendered in.
+
+    ``kind`` is either ``thread`` or ``process``. Pools are shared, so every deck asking for the same kind and size
+    of pool gets the same one.
+    """
+    try:
+        return _executors[kind, workers]
+    except KeyError:
+        pass
+    executor: Executor
+    if kind == "thread":
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+    elif kind == "process":
+        executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"Unknown render pool kind {kind!r}, expected 'thread' or 'process'")
+    return _executors.setdefault((kind, workers), executor)
+
+
+# Renders that are under way, per loop: a future can only be awaited on the loop it belongs to
+_in_flight: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple[KeyImageFormat, Hashable], asyncio.Future[bytes]]] = weakref.WeakKeyDictionary()
+
+
+async def get_text_image_async(
+    key_format: KeyImageFormat,
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    margins: tuple[int, int, int, int] = DEFAULT_MARGINS,
+    executor: Executor | None = None,
+    **kwargs,
+) -> bytes:
+    """
+    Like :func:`get_text_image`, but on a cache miss the image is rendered in ``executor`` instead of on the loop.
+
+    Concurrent requests for the same image (from decks of the same model, say) share a single render.
+    """
+    cache = image_cache_for(key_format)
+    cache_key = text_cache_key(text, font, margins, kwargs)
+    if (image := cache.get(cache_key)) is not None:
+        return image
+
+    loop = asyncio.get_running_loop()
+    in_flight = _in_flight.setdefault(loop, {})
+    if (pending := in_flight.get((key_format, cache_key))) is None:
+        pending = loop.run_in_executor(executor, functools.partial(render_text, key_format, text, font, margins, **kwargs))
+        in_flight[key_format, cache_key] = pending
+
+        def _done(fut: asyncio.Future[bytes]):
+            del in_flight[key_format, cache_key]
+            if not fut.cancelled() and fut.exception() is None:
+                cache.put(cache_key, fut.result())
+
+        pending.add_done_callback(_done)
+
+    # Shield it so one waiter being cancelled doesn't cancel the render for everyone else
+    return await asyncio.shield(pending)
+
+
+def to_native_batch(key_format: KeyImageFormat, images: Sequence[Image.Image]) -> list[bytes]:
+    """
+    Convert many key-sized images to the deck's native format at once.
+
+    If numpy is installed (the ``fast`` extra) the rotation, flips and colour conversion are done for the whole batch
+    in one go, leaving only the encoding to be done per image. Otherwise this is the same as calling
+    ``PILHelper.to_native_format`` on each image.
+    """
+    from PIL import Image
+    from StreamDeck.ImageHelpers import PILHelper
+
+    try:
+        import numpy as np
+    except ImportError:
+        return [bytes(PILHelper.to_native_format(key_format, image)) for image in images]
+
+    if not images:
+        return []
+
+    batch = np.stack([np.asarray(_key_sized_rgb(key_format, image)) for image in images])
+    # Same order as PILHelper: rotate, then flip. Axes are (image, row, column, channel)
+    if key_format.rotation:
+        batch = np.rot90(batch, k=key_format.rotation // 90, axes=(1, 2))
+    if key_format.flip[0]:
+        batch = batch[:, :, ::-1]
+    if key_format.flip[1]:
+        batch = batch[:, ::-1]
+
+    if key_format.format == "BMP":
+        return _encode_bmp_batch(key_format, batch)
+
+    frames = []
+    for pixels in batch:
+        with io.BytesIO() as buf:
+            Image.fromarray(np.ascontiguousarray(pixels)).save(buf, key_format.format, quality=100)
+            frames.append(buf.getvalue())
+    return frames
+
+
+def _key_sized_rgb(key_format: KeyImageFormat, image: Image.Image) -> Image.Image:
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.size != key_format.size:
+        image = image.resize(key_format.size)
+    return image
+
+
+@functools.lru_cache(maxsize=8)
+def _bmp_header(size: tuple[int, int]) -> bytes:
+    from PIL import Image
+
+    with io.BytesIO() as buf:
+        Image.new("RGB", size).save(buf, "BMP")
+        data = buf.getvalue()
+    width, height = size
+    return data[: len(data) - height * _bmp_stride(width)]
+
+
+def _bmp_stride(width: int) -> int:
+    # BMP rows are padded to a multiple of 4 bytes
+    return (width * 3 + 3) & ~3
+
+
+def _encode_bmp_batch(key_format: KeyImageFormat, batch):
+    # 24-bit BMP is just a header and then the rows bottom-up as BGR, so the whole batch can be laid out at once
+    import numpy as np
+
+    count, height, width, _ = batch.shape
+    header = _bmp_header((width, height))
+    rows = np.zeros((count, height, _bmp_stride(width)), dtype=np.uint8)
+    rows[:, :, : width * 3] = batch[:, ::-1, :, ::-1].reshape(count, height, width * 3)
+    return [header + pixels.tobytes() for pixels in rows]
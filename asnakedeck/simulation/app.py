@@ -163,6 +163,8 @@ class SimulatedDeck(StreamDeck):
     app: AsyncApp
 
     KEY_FLIP = (False, False)
+    # Kivy textures can only be touched from the main thread, so the writer mustn't use one of its own
+    WRITE_ON_LOOP = True
 
     def __init__(self, app: AsyncApp, serial_number: str):
         self.serial_number = serial_number
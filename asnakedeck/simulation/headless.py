@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import logging
+import os
+import time
+from collections.abc import Iterable
+from typing import Any
+
+import attr
+import yaml
+from StreamDeck.Devices.StreamDeck import StreamDeck
+from StreamDeck.Transport.Dummy import Dummy
+
+log = logging.getLogger(__name__)
+
+# How many of the most recent frames a headless deck remembers
+FRAME_BUFFER_SIZE = 4096
+
+
+@attr.frozen
+class RecordedFrame:
+    timestamp: float
+    key: int
+    image: bytes = attr.ib(repr=False)
+
+
+class HeadlessDeck(StreamDeck):
+    """
+    A simulated deck with no display at all, for load tests and benchmarks.
+
+    Every image sent to a key is recorded, with when it was sent, in ``frames``: a ring buffer of the most recent
+    ``FRAME_BUFFER_SIZE`` frames. Nothing is ever read from it, key presses are made with :func:`run_script` (or by
+    calling ``Deck.on_keypress`` directly).
+    """
+
+    serial_number: str
+    frames: collections.deque[RecordedFrame]
+    brightness: int | None = None
+
+    def __init__(self, serial_number: str, maxlen: int = FRAME_BUFFER_SIZE):
+        self.serial_number = serial_number
+        self.frames = collections.deque(maxlen=maxlen)
+        super().__init__(Dummy.Device("asnakedeck", "headless"))
+
+    def _read_key_states(self):
+        return None
+
+    def _reset_key_stream(self):
+        pass
+
+    def reset(self):
+        pass
+
+    def set_brightness(self, percent):
+        self.brightness = percent
+
+    def id(self):
+        # Every dummy device has the same path, so tell decks apart by serial number instead
+        return f"headless:{self.serial_number}"
+
+    def is_open(self):
+        # The dummy transport's ``is_open`` flag hides its ``is_open()`` method
+        return self.device.is_open
+
+    def get_serial_number(self):
+        return self.serial_number
+
+    def get_firmware_version(self):
+        return "N/A"
+
+    def set_key_image(self, key, image):
+        self.frames.append(RecordedFrame(time.monotonic(), key, bytes(image or self.BLANK_KEY_IMAGE)))  # type: ignore
+
+    def _setup_reader(self, callback):
+        # Nothing to read, presses are scripted
+        pass
+
+    def latest_frames(self) -> dict[int, RecordedFrame]:
+        """The last frame recorded for each key"""
+        return {frame.key: frame for frame in self.frames}
+
+    @classmethod
+    def make_simulation(cls, serial_number: str, kind: type[StreamDeck], maxlen: int = FRAME_BUFFER_SIZE) -> HeadlessDeck:
+        sim = cls(serial_number, maxlen)
+        # Copy across constants, including the rotation and flips, so frames are exactly what the real deck would be sent
+        for name, val in kind.__dict__.items():
+            if name == name.upper():
+                setattr(sim, name, val)
+        return sim
+
+
+async def run_script(deck: Any, steps: Iterable[dict[str, Any]]) -> None:
+    """
+    Press keys on a deck according to ``steps``, each one of:
+
+    - ``{press: N}`` / ``{release: N}``
+    - ``{tap: N}`` -- a press and release, ``hold`` seconds apart (default 0.05)
+    - ``{sleep: SECONDS}``
+    """
+    hardware = deck.hardware
+    for step in steps:
+        if "press" in step:
+            await deck.on_keypress(hardware, step["press"], True)
+        elif "release" in step:
+            await deck.on_keypress(hardware, step["release"], False)
+        elif "tap" in step:
+            await deck.on_keypress(hardware, step["tap"], True)
+            await asyncio.sleep(step.get("hold", 0.05))
+            await deck.on_keypress(hardware, step["tap"], False)
+        elif "sleep" in step:
+            await asyncio.sleep(step["sleep"])
+        else:
+            raise ValueError(f"Unknown script step {step!r}")
+
+
+async def main(serial: str, kind: type[StreamDeck], script: os.PathLike | None = None, duration: float | None = None) -> None:
+    from ..deck import Deck
+    from ..plugin_manager import PluginManager
+
+    hardware = HeadlessDeck.make_simulation(serial, kind)
+    deck = Deck(hardware, plugin_manager=PluginManager())  # type: ignore
+    start = time.monotonic()
+    try:
+        if script:
+            with open(script) as fh:
+                await run_script(deck, yaml.safe_load(fh) or [])
+        if duration is not None:
+            await asyncio.sleep(max(0.0, start + duration - time.monotonic()))
+        elif not script:
+            # Just run until interrupted
+            await asyncio.Event().wait()
+        # Let the writer catch up with the last frames
+        await asyncio.sleep(0.1)
+    finally:
+        deck.close()
+        elapsed = time.monotonic() - start
+        log.info("Recorded %d frames in %.1fs across %d keys", len(hardware.frames), elapsed, len(hardware.latest_frames()))
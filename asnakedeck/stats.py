@@ -0,0 +1,103 @@
+"""
+Latency histograms for key presses, from the report arriving to the key being redrawn.
+
+Each press is timestamped at every stage:
+
+``dispatch``
+    the report being read from the device, to ``Deck.on_keypress`` starting
+``handler``
+    how long each handler's ``on_keydown``/``on_keyup`` took
+``handled``
+    the report being read, to every handler having finished
+``frame``
+    the report being read, to the next image for that key (queued within ``FRAME_WINDOW``) having been written to
+    the deck, so including any wait for ``max_fps``/``key_max_fps`` and the write itself
+"""
+from __future__ import annotations
+
+import array
+import bisect
+import io
+
+import attr
+
+# Upper bounds of the histogram buckets, in seconds. Anything slower goes in a final overflow bucket
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+STAGES = ("dispatch", "handler", "handled", "frame")
+
+# Not every press redraws its key. One redrawn later than this (by a clock ticking over, say) wasn't redrawn because of
+# the press, so isn't counted
+FRAME_WINDOW = 1.0
+
+
+@attr.define
+class Histogram:
+    counts: array.array = attr.ib(factory=lambda: array.array("Q", bytes(8 * (len(LATENCY_BUCKETS) + 1))), repr=False)
+    count: int = 0
+    sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile, as the upper bound of the bucket it falls in"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+# deck serial, key number, handler (empty for the stages that aren't per handler), stage
+SeriesKey = tuple[str, int, str, str]
+
+
+@attr.define
+class LatencyStats:
+    series: dict[SeriesKey, Histogram] = attr.Factory(dict)
+
+    def observe(self, deck: str, key_number: int, stage: str, value: float, handler: str = "") -> None:
+        series_key = (deck, key_number, handler, stage)
+        if (histogram := self.series.get(series_key)) is None:
+            histogram = self.series[series_key] = Histogram()
+        histogram.observe(value)
+
+    def clear(self) -> None:
+        self.series.clear()
+
+    def format_text(self) -> str:
+        out = io.StringIO()
+        print(f"{'deck':<16} {'key':>3} {'handler':<12} {'stage':<9} {'count':>7} {'mean ms':>8} {'p50 ms':>7} {'p99 ms':>7}", file=out)
+        for (deck, key_number, handler, stage), histogram in sorted(self.series.items(), key=lambda item: (item[0][:3], STAGES.index(item[0][3]))):
+            mean = histogram.sum / histogram.count * 1000
+            print(
+                f"{deck:<16} {key_number:>3} {handler:<12} {stage:<9} {histogram.count:>7} {mean:>8.1f} "
+                f"{histogram.quantile(0.5) * 1000:>7g} {histogram.quantile(0.99) * 1000:>7g}",
+                file=out,
+            )
+        return out.getvalue()
+
+    def format_prometheus(self) -> str:
+        name = "asnakedeck_keypress_latency_seconds"
+        out = io.StringIO()
+        print(f"# HELP {name} Time from a key report being read to each stage of handling it", file=out)
+        print(f"# TYPE {name} histogram", file=out)
+        for (deck, key_number, handler, stage), histogram in sorted(self.series.items()):
+            labels = f'deck="{deck}",key="{key_number}",handler="{handler}",stage="{stage}"'
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), histogram.counts):
+                cumulative += count
+                print(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}', file=out)
+            print(f"{name}_sum{{{labels}}} {histogram.sum}", file=out)
+            print(f"{name}_count{{{labels}}} {histogram.count}", file=out)
+        return out.getvalue()
+
+
+latency = LatencyStats()
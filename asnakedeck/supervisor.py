@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Callable
+from typing import TYPE_CHECKING, Protocol
+
+import attr
+from StreamDeck.Transport.Transport import TransportError
+
+from . import platform
+
+if TYPE_CHECKING:
+    from StreamDeck.Devices.StreamDeck import StreamDeck
+
+    from .deck import Deck
+    from .plugin_manager import PluginManager
+
+log = logging.getLogger(__name__)
+
+# How long to wait after a device event before looking at what is plugged in. A hub reset produces a burst of
+# events, and udev needs a moment to set up the device nodes of newly added devices
+SETTLE_DELAY = 1.0
+# How often to look for devices when there is no way to be told about them
+POLL_INTERVAL = 5.0
+
+
+@attr.frozen
+class DeviceEvent:
+    action: str
+    devpath: str = ""
+
+
+class EventSource(Protocol):
+    def events(self) -> AsyncIterator[DeviceEvent]:
+        ...
+
+
+@attr.define
+class FakeEventSource:
+    """An event source that only reports what it's told to, for tests and simulations"""
+
+    queue: asyncio.Queue[DeviceEvent] = attr.ib(factory=asyncio.Queue, repr=False)
+
+    def add(self, devpath: str = "") -> None:
+        self.queue.put_nowait(DeviceEvent("add", devpath))
+
+    def remove(self, devpath: str = "") -> None:
+        self.queue.put_nowait(DeviceEvent("remove", devpath))
+
+    async def events(self) -> AsyncIterator[DeviceEvent]:
+        while True:
+            yield await self.queue.get()
+
+
+@attr.define
+class PollingEventSource:
+    """For platforms where we can't be told about new devices: just look again every so often"""
+
+    interval: float = POLL_INTERVAL
+
+    async def events(self) -> AsyncIterator[DeviceEvent]:
+        while True:
+            await asyncio.sleep(self.interval)
+            yield DeviceEvent("change")
+
+
+def default_event_source() -> EventSource:
+    if platform.WINDOWS:
+        return PollingEventSource()
+    from .platform.linux.udev import UdevEventSource
+
+    return UdevEventSource()
+
+
+def enumerate_devices() -> list[StreamDeck]:
+    from StreamDeck.DeviceManager import DeviceManager
+
+    if not platform.WINDOWS:
+        from .platform.linux.hidraw import enumerate_decks
+
+        # Prefer hidraw, so key presses can be read by the event loop
+        try:
+            if decks := enumerate_decks():
+                return decks
+        except (TransportError, OSError) as e:
+            log.debug("Unable to find decks through hidraw: %s", e)
+
+    return DeviceManager().enumerate()
+
+
+@attr.define
+class DeviceSupervisor:
+    """
+    Keep a :class:`~asnakedeck.deck.Deck` running for every StreamDeck that is plugged in.
+
+    Whenever ``source`` reports a device being added or removed the attached devices are enumerated again, decks are
+    created for any new ones and closed for any that have gone away. The frames each deck was showing are remembered
+    by serial number, so when it comes back (after a hub reset, say) it shows them again straight away rather than
+    waiting for every key to be redrawn.
+    """
+
+    plugin_manager: PluginManager
+    source: EventSource = attr.ib(factory=default_event_source)
+    enumerate: Callable[[], list[StreamDeck]] = enumerate_devices
+    settle_delay: float = SETTLE_DELAY
+
+    # Keyed by device path
+    decks: dict[str, Deck] = attr.Factory(dict)
+    # Keyed by serial number
+    frames: dict[str, dict[int, bytes]] = attr.ib(factory=dict, repr=False)
+    # Set when it's time to look at what is plugged in again
+    _changed: asyncio.Event = attr.ib(factory=asyncio.Event, repr=False)
+
+    async def run(self, ready: Callable[[], None] | None = None) -> None:
+        """Open the decks that are plugged in, calling ``ready`` once that's done, and keep them open until cancelled"""
+        changed = self._changed
+        listener = asyncio.create_task(self._listen(changed), name="device-events")
+        try:
+            await self.scan()
+            if ready:
+                ready()
+            while True:
+                await changed.wait()
+                # Let the burst of events from a replug settle before looking at what's there
+                await asyncio.sleep(self.settle_delay)
+                changed.clear()
+                await self.scan()
+        finally:
+            listener.cancel()
+
+    async def _listen(self, changed: asyncio.Event) -> None:
+        try:
+            async for event in self.source.events():
+                log.debug("Device %s: %s", event.action, event.devpath)
+                changed.set()
+        except OSError as e:
+            log.warning("Unable to watch for devices being plugged in, polling instead: %s", e)
+            async for event in PollingEventSource().events():
+                changed.set()
+
+    async def scan(self) -> None:
+        loop = asyncio.get_running_loop()
+        devices = {device.id(): device for device in await loop.run_in_executor(None, self.enumerate)}
+
+        for path, deck in list(self.decks.items()):
+            # The library closes the device if reading from it fails, in which case it needs opening afresh
+            if path not in devices or not deck.hardware.is_open():
+                self.remove(path)
+
+        for path, device in devices.items():
+            if path not in self.decks:
+                self.add(path, device)
+
+    def add(self, path: str, device: StreamDeck) -> None:
+        from .deck import Deck
+
+        try:
+            deck = Deck(device, plugin_manager=self.plugin_manager, on_close=self._on_deck_closed)
+        except (TransportError, OSError) as e:
+            # Most likely the device is still being set up, or is already unplugged again. Try again next event
+            log.warning("Unable to open deck at %s: %s", path, e)
+            return
+
+        if frames := self.frames.pop(deck.serial_number, None):
+            log.info("Deck %s reconnected, restoring %d keys", deck.serial_number, len(frames))
+            # Anything drawn while loading the config is newer, and keys with handlers will be redrawn by them anyway
+            for key_number, frame in frames.items():
+                if key_number not in deck.writer.frames:
+                    deck.writer.set_key_image(key_number, frame)
+        try:
+            deck.open()
+        except (TransportError, OSError) as e:
+            log.warning("Unable to open deck at %s: %s", path, e)
+            deck.close(reset=False)
+            return
+        self.decks[path] = deck
+
+    def remove(self, path: str) -> None:
+        deck = self.decks.pop(path)
+        log.info("Deck %s disconnected", deck.serial_number)
+        self.frames[deck.serial_number] = dict(deck.writer.frames)
+        deck.close(reset=False)
+
+    def _on_deck_closed(self, deck: Deck) -> None:
+        # Decks we close ourselves are already gone from ``decks``. Any other has closed itself (because its config
+        # watcher stopped, say) while still plugged in, so forget it and look again to open it afresh
+        for path, known in list(self.decks.items()):
+            if known is deck:
+                log.info("Deck %s closed, reopening it", deck.serial_number)
+                del self.decks[path]
+                self.frames[deck.serial_number] = dict(deck.writer.frames)
+                self._changed.set()
+
+    def close(self) -> None:
+        for path in list(self.decks):
+            deck = self.decks.pop(path)
+            deck.close()
@@ -0,0 +1,115 @@
+"""
+Opt-in accounting of the time each asyncio task spends running on the event loop.
+
+Every step of every task (the stretch between two ``await``\\s that actually suspend) is timed, in both wall and CPU
+time, and attributed to the task's name -- for key handlers that is ``Key-{n}-{name}-handler``. Steps slower than a
+threshold are logged, as they hold up everything else on the loop, key presses included.
+
+This works by wrapping ``asyncio.Handle._run``, so it costs a couple of clock reads per callback and is off unless
+``asnakedeck run --profile-tasks`` is used.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+from collections.abc import Callable
+from typing import Any
+
+import attr
+
+log = logging.getLogger(__name__)
+
+SLOW_STEP_THRESHOLD = 0.05  # seconds
+
+# Callbacks that aren't task steps (timers, I/O callbacks, ``call_soon``) are lumped together under this name
+OTHER_CALLBACKS = "(callbacks)"
+# As are tasks that were never given a name, which are mostly short-lived
+UNNAMED_TASKS = "(unnamed tasks)"
+_default_task_name = re.compile(r"Task-\d+")
+
+
+@attr.define
+class StepStats:
+    steps: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    max_wall: float = 0.0
+    slow_steps: int = 0
+
+    def as_list(self) -> list[Any]:
+        return [self.steps, self.wall, self.cpu, self.max_wall, self.slow_steps]
+
+
+@attr.define
+class TaskAccounting:
+    threshold: float = SLOW_STEP_THRESHOLD
+    tasks: dict[str, StepStats] = attr.Factory(dict)
+    _original_run: Callable[[asyncio.Handle], None] | None = attr.ib(default=None, repr=False)
+
+    @property
+    def installed(self) -> bool:
+        return self._original_run is not None
+
+    def install(self) -> None:
+        if self.installed:
+            return
+        original_run = self._original_run = asyncio.events.Handle._run
+        record = self.record
+
+        def _run(handle: asyncio.Handle) -> None:
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                original_run(handle)
+            finally:
+                record(handle, time.perf_counter() - wall, time.thread_time() - cpu)
+
+        asyncio.events.Handle._run = _run  # type: ignore[assignment]
+
+    def uninstall(self) -> None:
+        if self._original_run:
+            asyncio.events.Handle._run = self._original_run  # type: ignore[assignment]
+            self._original_run = None
+
+    def record(self, handle: asyncio.Handle, wall: float, cpu: float) -> None:
+        # Task steps and wake-ups are methods bound to the task
+        task = getattr(handle._callback, "__self__", None)  # type: ignore[attr-defined]
+        if not isinstance(task, asyncio.Task):
+            name = OTHER_CALLBACKS
+        elif _default_task_name.fullmatch(name := task.get_name()):
+            name = UNNAMED_TASKS
+        if (stats := self.tasks.get(name)) is None:
+            stats = self.tasks[name] = StepStats()
+        stats.steps += 1
+        stats.wall += wall
+        stats.cpu += cpu
+        stats.max_wall = max(stats.max_wall, wall)
+        if wall > self.threshold:
+            stats.slow_steps += 1
+            log.warning("Task %s blocked the event loop for %.1fms (%.1fms CPU)", name, wall * 1000, cpu * 1000)
+
+    def snapshot(self) -> dict[str, list[Any]]:
+        return {name: stats.as_list() for name, stats in self.tasks.items()}
+
+
+accounting = TaskAccounting()
+
+
+def format_top(current: dict[str, list[Any]], previous: dict[str, list[Any]], interval: float, limit: int = 20) -> str:
+    """
+    Format two snapshots like ``top``: the share of the interval each task spent running on the loop, busiest first.
+
+    Tasks are ordered by wall time rather than CPU, as a task blocked in a system call holds the loop up just as much.
+    """
+    rows = []
+    for name, (steps, wall, cpu, max_wall, slow_steps) in current.items():
+        prev_steps, prev_wall, prev_cpu, _, prev_slow = previous.get(name, (0, 0.0, 0.0, 0.0, 0))
+        rows.append((wall - prev_wall, cpu - prev_cpu, steps - prev_steps, slow_steps - prev_slow, max_wall, cpu, name))
+    rows.sort(reverse=True)
+
+    lines = [f"{'WALL%':>6} {'CPU%':>6} {'steps':>7} {'slow':>5} {'max ms':>8} {'CPU s':>8}  task"]
+    for wall_delta, cpu_delta, steps, slow_steps, max_wall, cpu, name in rows[:limit]:
+        wall_percent, cpu_percent = wall_delta / interval * 100, cpu_delta / interval * 100
+        lines.append(f"{wall_percent:>6.1f} {cpu_percent:>6.1f} {steps:>7} {slow_steps:>5} {max_wall * 1000:>8.1f} {cpu:>8.2f}  {name}")
+    return "\n".join(lines) + "\n"
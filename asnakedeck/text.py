@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import functools
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import TYPE_CHECKING, Any
+
+import attr
+
+from . import platform
+from .rendering import LINE_SPACING
+
+if TYPE_CHECKING:
+    from PIL import Image, ImageFont
+
+
+# Limits for the rasterized text shared by every deck. Labels tend to come from small sets (clock digits, volume
+# percentages) so these are rarely reached
+TEXT_CACHE_SIZE = 1024
+TEXT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+@functools.lru_cache(maxsize=64)
+def load_font(face: str, size: int) -> ImageFont.FreeTypeFont:
+    """Load a font, sharing the loaded font between every deck that uses it"""
+    from PIL import ImageFont
+
+    return ImageFont.truetype(platform.resolve_font(face), size)
+
+
+def font_key(font: ImageFont.FreeTypeFont) -> tuple[Any, ...]:
+    return (font.path, font.index, font.size)
+
+
+@attr.frozen
+class TextRaster:
+    """
+    A piece of text drawn once, ready to be composited onto a key image.
+
+    ``image`` is an ``L`` coverage mask (to be filled with any colour), or ``RGB`` on black when the font's own
+    colours are used. ``size`` is the size of the text as laid out, and ``ascent``/``descent`` are the font's line metrics.
+    """
+
+    image: Image.Image = attr.ib(repr=False)
+    size: tuple[int, int]
+    ascent: int
+    descent: int
+
+    @property
+    def nbytes(self) -> int:
+        width, height = self.image.size
+        return width * height * len(self.image.getbands())
+
+
+def rasterize(font: ImageFont.FreeTypeFont, text: str, embedded_color: bool = False, **kwargs) -> TextRaster:
+    """Draw ``text`` on its own, bypassing any cache"""
+    from PIL import Image, ImageDraw
+
+    size = font.getsize(text)
+    if embedded_color:
+        image = Image.new("RGB", size)
+        ImageDraw.Draw(image).text((0, 0), text, font=font, embedded_color=True, **kwargs)
+    else:
+        image = Image.new("L", size)
+        ImageDraw.Draw(image).text((0, 0), text, font=font, fill=255, **kwargs)
+    ascent, descent = font.getmetrics()
+    return TextRaster(image, size, ascent, descent)
+
+
+@attr.define
+class TextRasterCache:
+    """
+    A bounded LRU cache of :class:`TextRaster`, limited both in number of entries and in total bitmap size.
+
+    Text is rendered from the render pool's threads, so access is locked.
+    """
+
+    maxsize: int = TEXT_CACHE_SIZE
+    max_bytes: int = TEXT_CACHE_MAX_BYTES
+    nbytes: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: OrderedDict[Hashable, TextRaster] = attr.ib(factory=OrderedDict, repr=False)
+    _lock: threading.Lock = attr.ib(factory=threading.Lock, repr=False)
+
+    def get(self, key: Hashable) -> TextRaster | None:
+        with self._lock:
+            try:
+                raster = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return raster
+
+    def put(self, key: Hashable, raster: TextRaster) -> None:
+        if raster.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if (old := self.entries.pop(key, None)) is not None:
+                self.nbytes -= old.nbytes
+            self.entries[key] = raster
+            self.nbytes += raster.nbytes
+            while len(self.entries) > self.maxsize or self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+text_cache = TextRasterCache()
+
+
+def get_text_raster(font: ImageFont.FreeTypeFont, text: str, embedded_color: bool = False, **kwargs) -> TextRaster:
+    """Like :func:`rasterize`, but return the cached raster if this text has already been drawn in this font"""
+    cache_key = (font_key(font), text, embedded_color, tuple(sorted(kwargs.items())))
+    if (raster := text_cache.get(cache_key)) is None:
+        raster = rasterize(font, text, embedded_color, **kwargs)
+        text_cache.put(cache_key, raster)
+    return raster
+
+
+# Labels are never shrunk below this to make them fit, they are scaled down as a whole instead
+MIN_FONT_SIZE = 8
+
+
+@functools.lru_cache(maxsize=256)
+def font_variant(path: str, index: int, size: int) -> ImageFont.FreeTypeFont:
+    from PIL import ImageFont
+
+    return ImageFont.truetype(path, size, index=index)
+
+
+@functools.lru_cache(maxsize=4096)
+def text_width(path: str, index: int, size: int, text: str) -> float:
+    return font_variant(path, index, size).getlength(text)
+
+
+@functools.lru_cache(maxsize=64)
+def line_height(path: str, index: int, size: int) -> int:
+    ascent, descent = font_variant(path, index, size).getmetrics()
+    return ascent + descent
+
+
+@attr.frozen
+class TextLayout:
+    """Where each line of a label goes, and the font size it is drawn at"""
+
+    lines: tuple[str, ...]
+    font: ImageFont.FreeTypeFont = attr.ib(repr=False)
+    line_height: int
+    size: tuple[int, int]
+
+
+def wrap_text(path: str, index: int, size: int, text: str, width: int) -> list[str] | None:
+    """
+    Greedily wrap ``text`` into lines no wider than ``width``, keeping explicit newlines.
+
+    Returns ``None`` if a single word is too wide to fit on a line by itself.
+    """
+    space = text_width(path, index, size, " ")
+    lines = []
+    for paragraph in text.split("\n"):
+        line: list[str] = []
+        line_width = 0.0
+        for word in paragraph.split():
+            word_width = text_width(path, index, size, word)
+            if word_width > width:
+                return None
+            if line and line_width + space + word_width > width:
+                lines.append(" ".join(line))
+                line, line_width = [], 0.0
+            line_width += (space if line else 0) + word_width
+            line.append(word)
+        lines.append(" ".join(line))
+    return lines
+
+
+def _fits(path: str, index: int, size: int, text: str, box: tuple[int, int]) -> list[str] | None:
+    width, height = box
+    lines = wrap_text(path, index, size, text, width)
+    if lines is None or len(lines) * line_height(path, index, size) + (len(lines) - 1) * LINE_SPACING > height:
+        return None
+    return lines
+
+
+@functools.lru_cache(maxsize=1024)
+def _layout(path: str, index: int, max_size: int, text: str, box: tuple[int, int]) -> TextLayout:
+    # Bigger text never takes up less room, so binary search for the largest size that fits. Only the text is measured
+    # here, nothing is drawn
+    low, high = MIN_FONT_SIZE, max_size
+    best = None
+    while low <= high:
+        size = (low + high) // 2
+        if (lines := _fits(path, index, size, text, box)) is not None:
+            best = size, lines
+            low = size + 1
+        else:
+            high = size - 1
+    if best is None:
+        # Doesn't fit even at the smallest size, so it will be scaled down after it's drawn
+        size = min(MIN_FONT_SIZE, max_size)
+        best = size, wrap_text(path, index, size, text, box[0]) or text.split("\n")
+
+    size, lines = best
+    font = font_variant(path, index, size)
+    height = line_height(path, index, size)
+    width = max((text_width(path, index, size, line) for line in lines), default=0)
+    return TextLayout(tuple(lines), font, height, (int(width + 0.5), len(lines) * height + (len(lines) - 1) * LINE_SPACING))
+
+
+def layout_text(font: ImageFont.FreeTypeFont, text: str, box: tuple[int, int]) -> TextLayout:
+    """
+    Wrap ``text`` to fit in ``box``, at the largest size no bigger than ``font``'s.
+
+    Layouts are remembered per text, font and box size, so redrawing a label is just a lookup.
+    """
+    return _layout(font.path, font.index, font.size, text, box)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+import weakref
+from collections.abc import AsyncIterator
+
+import attr
+
+SECOND = 1
+MINUTE = 60
+
+# strftime directives whose output changes every second
+_SECONDS_DIRECTIVES = frozenset("ScTXrs")
+_DIRECTIVE_RE = re.compile(r"%[-_0^#]?[EO]?([a-zA-Z%])")
+
+
+@attr.define
+class Ticker:
+    """
+    Wakes every subscriber on the same wall clock boundary, e.g. at the start of each second or minute.
+
+    However many things subscribe there is only one timer per period, and as each tick is scheduled from the wall
+    clock it doesn't drift.
+    """
+
+    period: int
+    subscribers: int = 0
+    _tick: asyncio.Future[float] | None = attr.ib(default=None, repr=False)
+    _task: asyncio.Task | None = attr.ib(default=None, repr=False)
+
+    def _next_tick(self) -> asyncio.Future[float]:
+        if self._tick is None or self._tick.done():
+            self._tick = asyncio.get_running_loop().create_future()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name=f"ticker-{self.period}s")
+        return self._tick
+
+    async def _run(self) -> None:
+        while self.subscribers:
+            target = (time.time() // self.period + 1) * self.period
+            # The loop's clock isn't the wall clock, so we might be woken slightly early
+            while (remaining := target - time.time()) > 0:
+                await asyncio.sleep(remaining)
+            if self._tick and not self._tick.done():
+                self._tick.set_result(target)
+
+    async def ticks(self) -> AsyncIterator[float]:
+        """Yield the wall clock time of each tick"""
+        self.subscribers += 1
+        try:
+            while True:
+                # Shielded so a subscriber going away doesn't cancel the tick for everyone else
+                yield await asyncio.shield(self._next_tick())
+        finally:
+            self.subscribers -= 1
+
+
+# Tickers hold futures and tasks, so there is a set per event loop
+_tickers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[int, Ticker]] = weakref.WeakKeyDictionary()
+
+
+def ticks(period: int) -> AsyncIterator[float]:
+    """Subscribe to the shared ticker for ``period`` seconds on the running loop"""
+    tickers = _tickers.setdefault(asyncio.get_running_loop(), {})
+    try:
+        ticker = tickers[period]
+    except KeyError:
+        ticker = tickers.setdefault(period, Ticker(period))
+    return ticker.ticks()
+
+
+def period_for_format(format: str) -> int:
+    """How often the output of ``time.strftime(format)`` can change"""
+    if _SECONDS_DIRECTIVES.intersection(_DIRECTIVE_RE.findall(format)):
+        return SECOND
+    return MINUTE
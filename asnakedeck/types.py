@@ -1,15 +1,18 @@
 from __future__ import annotations
 
 import asyncio
+import time
 from collections.abc import Coroutine
 from typing import TYPE_CHECKING, Any
 
 import attr
-from PIL import Image, ImageDraw, ImageFont
-from StreamDeck.ImageHelpers import PILHelper
-from StreamDeck.Transport.Transport import TransportError
+
+from .rendering import get_text_image, get_text_image_async
+from .stats import latency
 
 if TYPE_CHECKING:
+    from PIL import ImageFont
+
     from .deck import Deck
 
 
@@ -41,40 +44,67 @@ class Key:
     deck: Deck = attr.ib(repr=False)
     handlers: list[KeyHandler] = attr.ib(repr=False, factory=list)
     tasks: set[asyncio.Task] = attr.ib(repr=False, factory=set)
+    render_generation: int = attr.ib(repr=False, default=0)
 
-    def update(self, **key) -> None:
-        text: str
-        font: ImageFont.FreeTypeFont
-        kwargs = {}
-
+    def _text_and_font(self, key: dict[str, Any]) -> tuple[str, ImageFont.FreeTypeFont, dict[str, Any]] | None:
         if "label" in key:
-            text = key["label"]
-            font = self.deck.label_font
+            # The label font's size is the largest the label is drawn at, long labels are wrapped and shrunk to fit
+            return key["label"], self.deck.label_font, dict(wrap=True)
         elif "emoji" in key:
-            text = key["emoji"]
-            font = self.deck.emoji_font
-            kwargs = dict(embedded_color=True, fill="white")
-        else:
+            return key["emoji"], self.deck.emoji_font, dict(embedded_color=True, fill="white")
+        return None
+
+    def render(self, **key) -> bytes | None:
+        """Render a ``label`` or ``emoji`` to the deck's native image format"""
+        if not (to_draw := self._text_and_font(key)):
+            return None
+        text, font, kwargs = to_draw
+        return get_text_image(self.deck.key_format, text, font, **kwargs)
+
+    def update(self, **key) -> None:
+        deck_image = self.render(**key)
+        if deck_image is None:
+            return
+        self.show(deck_image)
+
+    async def prerender(self, **key) -> bytes | None:
+        """Render a ``label`` or ``emoji`` in the deck's render pool, without showing it"""
+        if not (to_draw := self._text_and_font(key)):
+            return None
+        text, font, kwargs = to_draw
+        return await get_text_image_async(self.deck.key_format, text, font, executor=self.deck.render_executor, **kwargs)
+
+    async def render_async(self, **key) -> None:
+        """
+        Like :meth:`update`, but render the image in the deck's render pool so the event loop isn't blocked.
+
+        If another update for this key is made while this one is rendering, this one is dropped.
+        """
+        self.render_generation += 1
+        generation = self.render_generation
+        deck_image = await self.prerender(**key)
+        if deck_image is None or generation != self.render_generation:
             return
+        self.show(deck_image)
 
-        text_size = font.getsize(text)
-        image = Image.new("RGB", text_size)
-        draw = ImageDraw.Draw(image)
-        draw.text((0, 0), text, font=font, **kwargs)
-        scaled_image = PILHelper.create_scaled_image(self.deck.hardware, image, margins=[4, 4, 4, 4])
-        deck_image = PILHelper.to_native_format(self.deck.hardware, scaled_image)
-        # TODO: cache images, store state, re-send on exception
-        try:
-            self.deck.hardware.set_key_image(self.number, deck_image)
-        except TransportError:
-            pass
+    def show(self, deck_image: bytes) -> None:
+        # Anything still rendering in the background is now out of date
+        self.render_generation += 1
+        self.deck.set_key_image(self.number, deck_image)
 
     def add_task(self, task: asyncio.Task):
         task.add_done_callback(self.tasks.remove)
         self.tasks.add(task)
 
     def on_keydown(self):
-        return asyncio.gather(*[handler.on_keydown() for handler in self.handlers])
+        return asyncio.gather(*[self._timed(handler, "on_keydown") for handler in self.handlers])
 
     def on_keyup(self):
-        return asyncio.gather(*[handler.on_keyup() for handler in self.handlers])
+        return asyncio.gather(*[self._timed(handler, "on_keyup") for handler in self.handlers])
+
+    async def _timed(self, handler: KeyHandler, method: str) -> None:
+        start = time.monotonic()
+        try:
+            await getattr(handler, method)()
+        finally:
+            latency.observe(self.deck.serial_number, self.number, "handler", time.monotonic() - start, handler=type(handler).__name__)
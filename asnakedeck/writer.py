@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+import attr
+from StreamDeck.Transport.Transport import TransportError
+
+from .stats import latency
+
+if TYPE_CHECKING:
+    from StreamDeck.Devices.StreamDeck import StreamDeck
+
+log = logging.getLogger(__name__)
+
+RETRY_MIN_DELAY = 0.1
+RETRY_MAX_DELAY = 5.0
+
+
+def frame_digest(image: bytes) -> bytes:
+    return hashlib.blake2b(image, digest_size=16).digest()
+
+
+class InlineExecutor(Executor):
+    """Runs each call straight away in the calling thread, i.e. on the event loop"""
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def executor_for(hardware: StreamDeck, name: str) -> Executor:
+    # Some simulated decks (the Kivy one) can only be drawn on from the main thread, which is the one running the loop
+    if getattr(hardware, "WRITE_ON_LOOP", False):
+        return InlineExecutor()
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"DeckWriter-{name}")
+
+
+@attr.define(slots=False)
+class DeviceWriter:
+    """
+    Owns all output to a deck.
+
+    Writes are queued and performed by a background task in a dedicated thread, so a slow USB device never blocks
+    the event loop (simulated decks that set ``WRITE_ON_LOOP`` are written to on the loop instead). Only the most
+    recent image queued for each key is written, and if the device errors the writer backs off and then re-sends
+    everything it believes the deck should be showing.
+
+    Queued images are written in batches. ``max_fps`` limits how often a batch is written to the deck, and
+    ``key_max_fps`` how often any one key is updated; frames queued faster than that replace each other.
+    """
+
+    hardware: StreamDeck
+    name: str
+
+    max_fps: float | None = None
+    key_max_fps: float | None = None
+
+    # What each key should be showing, used to restore the deck after an error
+    frames: dict[int, bytes] = attr.ib(factory=dict, repr=False)
+    brightness: int | None = None
+
+    # Latest image per key that hasn't been written yet
+    pending: dict[int, bytes] = attr.ib(factory=dict, repr=False)
+    pending_reset: bool = False
+    pending_brightness: int | None = None
+    # When the key press that led to each pending frame was read, for the press-to-frame latency
+    pressed_at: dict[int, float] = attr.ib(factory=dict, repr=False)
+
+    # Digest of the image last written to each key, and of the one being written right now
+    written: dict[int, bytes] = attr.ib(factory=dict, repr=False)
+    in_flight: dict[int, bytes] = attr.ib(factory=dict, repr=False)
+    # Loop time of the last write to each key, and of the last batch
+    written_at: dict[int, float] = attr.ib(factory=dict, repr=False)
+    last_flush: float = attr.ib(default=float("-inf"), repr=False)
+
+    suppressed_writes: int = 0
+    coalesced_frames: int = 0
+    failed_writes: int = 0
+    batches: int = 0
+
+    task: asyncio.Task | None = attr.ib(default=None, repr=False)
+    _wakeup: asyncio.Event = attr.ib(factory=asyncio.Event, repr=False)
+    _executor: Executor = attr.ib(default=None, repr=False)
+
+    def __attrs_post_init__(self):
+        if self._executor is None:
+            self._executor = executor_for(self.hardware, self.name)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run(), name=f"DeckWriter-{self.name}")
+        self.task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and (exc := task.exception()):
+            log.error("Writer for deck %s died", self.name, exc_info=exc)
+
+    def close(self) -> None:
+        if self.task:
+            self.task.cancel("Deck going away")
+            self.task = None
+        # Let any write that is already in progress finish before the device is closed
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def configure(self, max_fps: float | None = None, key_max_fps: float | None = None) -> None:
+        self.max_fps = max_fps
+        self.key_max_fps = key_max_fps
+        self._wakeup.set()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "suppressed_writes": self.suppressed_writes,
+            "coalesced_frames": self.coalesced_frames,
+            "failed_writes": self.failed_writes,
+            "batches": self.batches,
+        }
+
+    def set_key_image(self, key: int, image: bytes, pressed_at: float | None = None) -> None:
+        """
+        Queue ``image`` to be written to ``key``.
+
+        ``pressed_at`` is when the key press that caused this frame was read. Once it has been written the time since
+        then is recorded as the press's ``frame`` latency.
+        """
+        self.frames[key] = image
+        digest = frame_digest(image)
+        if key in self.pending:
+            self.coalesced_frames += 1
+            del self.pending[key]
+        # Either the key is showing it already, or is about to be
+        if self.written.get(key) == digest or self.in_flight.get(key) == digest:
+            self.suppressed_writes += 1
+            self.pressed_at.pop(key, None)
+            return
+        self.pending[key] = image
+        if pressed_at is not None:
+            # A newer frame replacing one from a press is still the press's frame, timed from the earliest press
+            self.pressed_at.setdefault(key, pressed_at)
+        self._wakeup.set()
+
+    def set_brightness(self, percent: int) -> None:
+        self.brightness = percent
+        self.pending_brightness = percent
+        self._wakeup.set()
+
+    def reset(self) -> None:
+        # Anything queued would be wiped by the reset anyway
+        self.pending.clear()
+        self.pressed_at.clear()
+        self.frames.clear()
+        self.written.clear()
+        self.in_flight.clear()
+        self.pending_reset = True
+        self._wakeup.set()
+
+    def resend(self) -> None:
+        """Queue everything the deck should be showing, e.g. because it was reset behind our back"""
+        self.written.clear()
+        self.in_flight.clear()
+        self.pending = dict(self.frames)
+        self.pending_brightness = self.brightness
+        self._wakeup.set()
+
+    @property
+    def idle(self) -> bool:
+        return not (self.pending or self.pending_reset or self.pending_brightness is not None)
+
+    async def run(self) -> None:
+        delay = RETRY_MIN_DELAY
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while not self.idle:
+                if (wait := self._time_to_next_flush()) > 0:
+                    # Give more frames the chance to arrive, and be coalesced, before the next batch
+                    await asyncio.sleep(wait)
+                try:
+                    await self.flush()
+                except TransportError as e:
+                    self.failed_writes += 1
+                    log.warning("Error writing to deck %s, retrying in %.1fs: %s", self.name, delay, e)
+                    # We can't tell what the deck is showing now, so send it all again
+                    self.resend()
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, RETRY_MAX_DELAY)
+                else:
+                    delay = RETRY_MIN_DELAY
+
+    def _time_to_next_flush(self) -> float:
+        now = asyncio.get_running_loop().time()
+        due = now
+        if self.max_fps:
+            due = max(due, self.last_flush + 1 / self.max_fps)
+        if self.key_max_fps and self.pending and not self.pending_reset and self.pending_brightness is None:
+            # Nothing to do until at least one of the keys is allowed to update again
+            key_interval = 1 / self.key_max_fps
+            due = max(due, min(self.written_at.get(key, float("-inf")) + key_interval for key in self.pending))
+        return due - now
+
+    async def flush(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = self.last_flush = loop.time()
+        self.batches += 1
+        if self.pending_reset:
+            await self._call(self.hardware.reset)
+            self.pending_reset = False
+        if (brightness := self.pending_brightness) is not None:
+            await self._call(self.hardware.set_brightness, brightness)
+            if self.pending_brightness == brightness:
+                self.pending_brightness = None
+        key_interval = 1 / self.key_max_fps if self.key_max_fps else 0
+        # Anything queued while this batch is being written waits for the next one
+        for key in list(self.pending):
+            if now - self.written_at.get(key, float("-inf")) < key_interval or key not in self.pending:
+                continue
+            image = self.pending.pop(key)
+            pressed_at = self.pressed_at.pop(key, None)
+            # Until this write finishes we don't know which image the key is showing
+            self.written.pop(key, None)
+            digest = self.in_flight[key] = frame_digest(image)
+            try:
+                await self._call(self.hardware.set_key_image, key, image)
+            except BaseException:
+                self.in_flight.pop(key, None)
+                # Put it back, unless a newer frame has arrived in the meantime
+                self.pending.setdefault(key, image)
+                if pressed_at is not None:
+                    self.pressed_at.setdefault(key, pressed_at)
+                raise
+            # Unless the deck was reset while this was being written
+            if self.in_flight.pop(key, None) == digest:
+                self.written[key] = digest
+            self.written_at[key] = now
+            if pressed_at is not None:
+                latency.observe(self.name, key, "frame", time.monotonic() - pressed_at)
+
+    async def _call(self, func: Callable[..., Any], *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the render and dispatch hot paths, run against headless simulated decks.
+
+Run them with ``make bench`` (or ``python -m benchmarks``) and compare the JSON output between commits with
+``python -m benchmarks --compare OLD.json``.
+"""
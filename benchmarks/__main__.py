@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Optional
+
+import typer
+
+cli = typer.Typer()
+
+# Changes smaller than this, either way, aren't reported as a regression or improvement
+NOISE_THRESHOLD = 0.1
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: dict[str, Any], new: dict[str, Any]) -> str:
+    lines = [f"{'benchmark':<44} {'old µs':>10} {'new µs':>10} {'change':>8}"]
+    for name, result in new["results"].items():
+        if not (previous := old["results"].get(name)):
+            lines.append(f"{name:<44} {'-':>10} {result['median_us']:>10.1f}")
+            continue
+        change = result["median_us"] / previous["median_us"] - 1
+        flag = "  slower" if change > NOISE_THRESHOLD else "  faster" if change < -NOISE_THRESHOLD else ""
+        lines.append(f"{name:<44} {previous['median_us']:>10.1f} {result['median_us']:>10.1f} {change:>+8.1%}{flag}")
+    return "\n".join(lines)
+
+
+@cli.command()
+def main(
+    output: Optional[Path] = typer.Option(None, "--output", "-o", help="Write the results to this JSON file"),
+    compare_with: Optional[Path] = typer.Option(None, "--compare", exists=True, dir_okay=False, help="Results from an earlier run to compare against"),
+    only: Optional[list[str]] = typer.Option(None, "--only", help="Only run these benchmarks (may be repeated)"),
+    font: str = typer.Option("DroidSans", "--font", help="Font to draw labels with"),
+    quick: bool = typer.Option(False, "--quick", help="Fewer repetitions, for checking the benchmarks run rather than timing"),
+):
+    """Time the render and dispatch hot paths against headless simulated decks"""
+    from .cases import BENCHMARKS, Context
+
+    if unknown := set(only or ()) - set(BENCHMARKS):
+        raise typer.BadParameter(f"Unknown benchmarks {', '.join(sorted(unknown))}, expected some of {', '.join(BENCHMARKS)}", param_hint="--only")
+
+    # Keep the benchmark's config files and caches away from the real ones. This must happen before asnakedeck.platform
+    # is imported (the cases only import it when they run), as that is when the directories are decided.
+    tmp = tempfile.TemporaryDirectory(prefix="asnakedeck-bench-")
+    os.environ["XDG_CONFIG_HOME"] = os.path.join(tmp.name, "config")
+    os.environ["XDG_STATE_HOME"] = os.path.join(tmp.name, "state")
+
+    ctx = Context(font=font, quick=quick)
+    results: dict[str, Any] = {}
+
+    async def run_all():
+        for name, func in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+            typer.echo(f"Running {name}", err=True)
+            results.update(await func(ctx))
+
+    with tmp:
+        asyncio.run(run_all())
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "quick": quick,
+        "results": results,
+    }
+
+    if output:
+        output.write_text(json.dumps(report, indent=2) + "\n")
+    if compare_with:
+        print(compare(json.loads(compare_with.read_text()), report))
+    else:
+        for name, result in results.items():
+            print(f"{name:<44} {result['median_us']:>10.1f}µs  (p95 {result['p95_us']:.1f}µs, {result['ops_per_sec']:.0f}/s)")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import os
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+import attr
+import yaml
+
+from .timing import measure, measure_async, summarise
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+DECK_TYPES = ("StreamDeckMini", "StreamDeckOriginal", "StreamDeckOriginalV2", "StreamDeckXL")
+CONFIG_SIZES = (15, 32, 1000)
+
+# The benchmarks shouldn't depend on the package being installed for its entrypoints to be found
+BUILTIN_HANDLERS = {
+    "label": "asnakedeck.handlers.label:Label",
+    "cycle": "asnakedeck.handlers.cycle:Cycle",
+}
+
+
+@attr.define
+class Context:
+    font: str
+    # Fewer repetitions, for a quick check rather than numbers to compare
+    quick: bool = False
+    serials: int = 0
+
+    def repeat(self, full: int) -> int:
+        return max(3, full // 10) if self.quick else full
+
+    def make_plugin_manager(self):
+        from asnakedeck.plugin_manager import PluginManager
+
+        pm = PluginManager()
+        for name, target in BUILTIN_HANDLERS.items():
+            module, _, attribute = target.partition(":")
+            pm.key_handlers.register(name, getattr(importlib.import_module(module), attribute))
+        return pm
+
+    def write_config(self, serial: str, keys: list[dict[str, Any]]) -> None:
+        from asnakedeck import platform
+
+        platform.CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+        config = {"label_font": {"face": self.font, "size": 20}, "keys": keys}
+        (platform.CONFIG_DIR / f"{serial}.yaml").write_text(yaml.safe_dump(config))
+
+    def make_deck(self, kind: str, keys: list[dict[str, Any]]):
+        from asnakedeck.deck import Deck
+        from asnakedeck.simulation.headless import HeadlessDeck
+
+        # A fresh serial, and so config file, for every deck
+        self.serials += 1
+        serial = f"BENCH{self.serials:04}"
+        self.write_config(serial, keys)
+        module = importlib.import_module(f"StreamDeck.Devices.{kind}")
+        hardware = HeadlessDeck.make_simulation(serial, getattr(module, kind))
+        return Deck(hardware, plugin_manager=self.make_plugin_manager())  # type: ignore[arg-type]
+
+
+Benchmark = Callable[[Context], Awaitable[dict[str, dict[str, Any]]]]
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(func: Benchmark) -> Benchmark:
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def synthetic_keys(count: int, cols: int, suffix: str = "") -> list[dict[str, Any]]:
+    return [{"line": n // cols + 1, "column": n % cols + 1, "label": f"Key {n}{suffix}"} for n in range(count)]
+
+
+@benchmark
+async def key_update(ctx: Context) -> dict[str, dict[str, Any]]:
+    """Rendering and queueing a label, for text that has (hit) and hasn't (miss) been drawn before"""
+    from asnakedeck.types import Key
+
+    results = {}
+    for kind in DECK_TYPES:
+        deck = ctx.make_deck(kind, [])
+        key = Key(number=0, config={}, deck=deck)
+        try:
+            texts = iter(range(10**9))
+            results[f"key_update.miss.{kind}"] = measure(lambda: key.update(label=f"{kind} {next(texts)}"), ctx.repeat(200))
+            results[f"key_update.hit.{kind}"] = measure(lambda: key.update(label="Hello"), ctx.repeat(200), number=20)
+        finally:
+            deck.close()
+        await asyncio.sleep(0)
+    return results
+
+
+@benchmark
+async def load_config(ctx: Context) -> dict[str, dict[str, Any]]:
+    """Reloading a config where every key has changed, and one where none have"""
+    results = {}
+    for size in CONFIG_SIZES:
+        deck = ctx.make_deck("StreamDeckXL", synthetic_keys(size, 8))
+        serial = deck.serial_number
+        try:
+            generation = iter(range(10**9))
+
+            async def changed():
+                ctx.write_config(serial, synthetic_keys(size, 8, suffix=f" v{next(generation)}"))
+                start = time.perf_counter()
+                deck.load_config()
+                elapsed = time.perf_counter() - start
+                # Let the old keys' tasks finish being cancelled before the next round
+                await asyncio.sleep(0)
+                return elapsed
+
+            async def unchanged():
+                start = time.perf_counter()
+                deck.load_config()
+                elapsed = time.perf_counter() - start
+                await asyncio.sleep(0)
+                return elapsed
+
+            repeat = ctx.repeat(5 if size >= 1000 else 30)
+            results[f"load_config.changed.{size}"] = summarise([await changed() for _ in range(repeat)])
+            results[f"load_config.unchanged.{size}"] = summarise([await unchanged() for _ in range(repeat)])
+        finally:
+            deck.close()
+        await asyncio.sleep(0)
+    return results
+
+
+@benchmark
+async def on_keypress(ctx: Context) -> dict[str, dict[str, Any]]:
+    """A press on a cycling key, from ``Deck.on_keypress`` until the new frame has been written to the deck"""
+    deck = ctx.make_deck("StreamDeckOriginalV2", [{"line": 1, "column": 1, "cycle": [{"label": "On"}, {"label": "Off"}]}])
+    hardware = deck.hardware
+    try:
+        # Let the cycle pre-render its frames and the first of them be written, the frames written when the deck is
+        # opened don't count
+        for _ in range(500):
+            await asyncio.sleep(0.01)
+            if all(hasattr(handler, "frames") for handler in deck.keys[0].handlers) and deck.writer.idle:
+                break
+
+        async def press():
+            last = hardware.frames[-1] if hardware.frames else None
+            await deck.on_keypress(hardware, 0, False)
+            # Compare the last frame rather than the count, the buffer stops growing once it's full
+            deadline = time.perf_counter() + 1
+            while (hardware.frames[-1] if hardware.frames else None) is last and time.perf_counter() < deadline:
+                await asyncio.sleep(0)
+
+        return {"on_keypress.round_trip": await measure_async(press, ctx.repeat(200))}
+    finally:
+        deck.close()
+
+
+@benchmark
+async def plugin_lookup(ctx: Context) -> dict[str, dict[str, Any]]:
+    """
+    Looking up key handlers by name, as every key build does.
+
+    ``hit`` and ``miss`` are against a plugin manager whose entrypoints are already loaded. The first lookup in a
+    fresh process goes through the on-disk entrypoint index instead: ``warm_index`` when the index is up to date, and
+    ``cold_index`` when it is missing and every installed distribution has to be scanned to rebuild it.
+    """
+    from asnakedeck.plugin_manager import PluginManager
+
+    pm = ctx.make_plugin_manager()
+    # Make sure the entrypoint index has been loaded before timing misses
+    pm.key_handlers.get("no-such-handler")
+    results = {
+        "plugin_lookup.hit": measure(lambda: pm.key_handlers.get("label"), ctx.repeat(100), number=1000),
+        "plugin_lookup.miss": measure(lambda: pm.key_handlers.get("no-such-handler"), ctx.repeat(100), number=100),
+    }
+
+    def first_lookup(index_exists: bool) -> float:
+        fresh = PluginManager()
+        if not index_exists:
+            fresh.entrypoint_index_path.unlink(missing_ok=True)
+        start = time.perf_counter()
+        fresh.key_handlers.get("label")
+        return time.perf_counter() - start
+
+    repeat = ctx.repeat(30)
+    results["plugin_lookup.cold_index"] = summarise([first_lookup(index_exists=False) for _ in range(repeat)])
+    # The last cold lookup left an up to date index behind
+    results["plugin_lookup.warm_index"] = summarise([first_lookup(index_exists=True) for _ in range(repeat)])
+    results["plugin_lookup.fingerprint"] = measure(PluginManager.path_fingerprint, ctx.repeat(100), number=10)
+    return results
+
+
+@benchmark
+async def cold_start(ctx: Context) -> dict[str, dict[str, Any]]:
+    """Starting a fresh interpreter and importing the CLI, and the deck machinery"""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_ROOT), os.environ.get("PYTHONPATH")]))}
+
+    def run(code: str) -> Callable[[], None]:
+        def start() -> None:
+            subprocess.run([sys.executable, "-c", code], env=env, check=True)
+
+        return start
+
+    repeat = ctx.repeat(20)
+    return {
+        "cold_start.interpreter": measure(run("pass"), repeat),
+        "cold_start.import_cli": measure(run("import asnakedeck.__main__"), repeat),
+        "cold_start.import_deck": measure(run("import asnakedeck.deck"), repeat),
+    }
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+
+def summarise(samples: list[float], ops_per_sample: int = 1) -> dict[str, Any]:
+    """Summarise timings, in seconds, of ``ops_per_sample`` operations each"""
+    per_op = sorted(sample / ops_per_sample for sample in samples)
+    return {
+        "samples": len(per_op),
+        "min_us": per_op[0] * 1e6,
+        "median_us": statistics.median(per_op) * 1e6,
+        "p95_us": per_op[min(len(per_op) - 1, int(len(per_op) * 0.95))] * 1e6,
+        "ops_per_sec": 1 / statistics.median(per_op) if per_op[0] else float("inf"),
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int, number: int = 1) -> dict[str, Any]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append(time.perf_counter() - start)
+    return summarise(samples, number)
+
+
+async def measure_async(func: Callable[[], Awaitable[Any]], repeat: int) -> dict[str, Any]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - start)
+    return summarise(samples)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Callable
+
+import pytest
+
+from asnakedeck import hookimpl, platform
+
+
+@pytest.fixture(autouse=True)
+def config_dir(tmp_path, monkeypatch):
+    """Keep every test's config files and caches to itself"""
+    monkeypatch.setattr(platform, "CONFIG_DIR", tmp_path / "config", raising=False)
+    monkeypatch.setattr(platform, "STATE_DIR", tmp_path / "state", raising=False)
+    return platform.CONFIG_DIR
+
+
+class EventRecorder:
+    def __init__(self):
+        self.added = []
+        self.removed = []
+
+    @hookimpl
+    def asnakedeck_deck_added(self, events):
+        self.added.extend(events)
+
+    @hookimpl
+    def asnakedeck_deck_removed(self, events):
+        self.removed.extend(events)
+
+
+@pytest.fixture
+def plugin_manager():
+    from asnakedeck.plugin_manager import PluginManager
+
+    pm = PluginManager()
+    pm.recorder = EventRecorder()
+    pm.hooks.register(pm.recorder)
+    return pm
+
+
+async def wait_for(predicate: Callable[[], object], timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        await asyncio.sleep(0.01)
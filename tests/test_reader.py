@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+
+from StreamDeck.Devices.StreamDeckOriginalV2 import StreamDeckOriginalV2
+from StreamDeck.Transport.Dummy import Dummy
+from StreamDeck.Transport.Transport import TransportError
+
+from asnakedeck.reader import KeyReader
+from tests.conftest import wait_for
+
+
+class FakeHIDDevice(Dummy.Device):
+    """
+    A transport with a real file descriptor, for exercising :class:`KeyReader` without a deck.
+
+    Reports passed to :meth:`send_report` are read back by the deck one at a time, just like a hidraw node.
+    """
+
+    def __init__(self, vid: int, pid: int):
+        super().__init__(vid, pid)
+        self._device_end, self._test_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._device_end.setblocking(False)
+
+    def fileno(self) -> int:
+        return self._device_end.fileno()
+
+    def send_report(self, report: bytes) -> None:
+        self._test_end.send(report)
+
+    def read(self, length):
+        try:
+            report = self._device_end.recv(length)
+        except BlockingIOError:
+            return None
+        if not report:
+            # As with the hidraw transport, an empty read means the device has been unplugged
+            raise TransportError("Device has been unplugged")
+        return report
+
+    def unplug(self) -> None:
+        self._test_end.close()
+
+    def close(self):
+        super().close()
+        self._device_end.close()
+        self._test_end.close()
+
+
+def key_report(*pressed: int) -> bytes:
+    """A StreamDeck Original V2 key report: a 4 byte header and then a byte per key"""
+    return bytes(4) + bytes(int(n in pressed) for n in range(StreamDeckOriginalV2.KEY_COUNT))
+
+
+async def start_reader() -> tuple[FakeHIDDevice, StreamDeckOriginalV2, KeyReader, list[tuple[int, bool, float]]]:
+    device = FakeHIDDevice(0x0FD9, 0x006D)
+    hardware = StreamDeckOriginalV2(device)
+    device.open()
+    events: list[tuple[int, bool, float]] = []
+
+    async def callback(deck, key_number, state, timestamp):
+        assert deck is hardware
+        events.append((key_number, state, timestamp))
+
+    reader = KeyReader(hardware, callback)
+    assert KeyReader.supported(hardware)
+    reader.start()
+    return device, hardware, reader, events
+
+
+def test_only_changes_are_reported():
+    async def main():
+        device, hardware, reader, events = await start_reader()
+        try:
+            device.send_report(key_report(3))
+            device.send_report(key_report(3, 5))
+            # Nothing has changed, so nothing to report
+            device.send_report(key_report(3, 5))
+            device.send_report(key_report(5))
+            device.send_report(key_report())
+            await wait_for(lambda: len(events) == 4)
+            await asyncio.sleep(0.01)
+            return events, hardware.last_key_states
+        finally:
+            reader.stop()
+            device.close()
+
+    events, last_states = asyncio.run(main())
+    assert [(key, state) for key, state, _ in events] == [(3, True), (5, True), (3, False), (5, False)]
+    assert not any(last_states)
+
+
+def test_keys_changing_in_one_report_share_a_timestamp():
+    async def main():
+        device, hardware, reader, events = await start_reader()
+        try:
+            device.send_report(key_report(0, 14))
+            await wait_for(lambda: len(events) == 2)
+            return events
+        finally:
+            reader.stop()
+            device.close()
+
+    (first, first_state, first_time), (last, last_state, last_time) = asyncio.run(main())
+    assert (first, first_state, last, last_state) == (0, True, 14, True)
+    assert first_time == last_time
+
+
+def test_unplugged_device_is_closed():
+    async def main():
+        device, hardware, reader, events = await start_reader()
+        device.send_report(key_report(1))
+        await wait_for(lambda: events)
+        device.unplug()
+        await wait_for(lambda: not device.is_open)
+        return reader, events
+
+    reader, events = asyncio.run(main())
+    assert reader.fd is None
+    assert [(key, state) for key, state, _ in events] == [(1, True)]
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from asnakedeck import rendering
+
+
+def test_renders_in_flight_on_another_loop_are_not_shared(monkeypatch):
+    key_format = rendering.KeyImageFormat(deck_type="Stream Deck Original", size=(72, 72), format="JPEG", flip=(True, True), rotation=0)
+    font = SimpleNamespace(path="font.ttf", index=0, size=20)
+    started = threading.Event()
+    finish = threading.Event()
+
+    def render_text(key_format, text, font, margins, **kwargs):
+        # Only the first render is slow
+        if not started.is_set():
+            started.set()
+            assert finish.wait(5)
+        return text.encode()
+
+    monkeypatch.setattr(rendering, "render_text", render_text)
+
+    def render() -> bytes:
+        return asyncio.run(rendering.get_text_image_async(key_format, "Hello", font))  # type: ignore[arg-type]
+
+    # One loop starts rendering, and while that is under way another loop asks for the same image
+    results: list[bytes] = []
+    first = threading.Thread(target=lambda: results.append(render()))
+    first.start()
+    try:
+        assert started.wait(5)
+        assert render() == b"Hello"
+    finally:
+        finish.set()
+        first.join()
+    assert results == [b"Hello"]
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from StreamDeck.Devices.StreamDeckOriginalV2 import StreamDeckOriginalV2
+
+from asnakedeck.simulation.headless import HeadlessDeck
+from asnakedeck.supervisor import DeviceSupervisor, FakeEventSource
+from tests.conftest import wait_for
+
+
+def make_hardware(serial: str = "ABC123") -> HeadlessDeck:
+    return HeadlessDeck.make_simulation(serial, StreamDeckOriginalV2)
+
+
+class Harness:
+    def __init__(self, plugin_manager):
+        self.plugged: list[HeadlessDeck] = []
+        self.source = FakeEventSource()
+        self.supervisor = DeviceSupervisor(plugin_manager, source=self.source, enumerate=lambda: list(self.plugged), settle_delay=0)
+        self.task: asyncio.Task | None = None
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(self.supervisor.run())
+        return self
+
+    async def __aexit__(self, *exc):
+        assert self.task
+        self.task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await self.task
+        self.supervisor.close()
+
+    async def plug(self, hardware: HeadlessDeck):
+        self.plugged.append(hardware)
+        self.source.add(hardware.id())
+        await wait_for(lambda: hardware.id() in self.supervisor.decks)
+        return self.supervisor.decks[hardware.id()]
+
+    async def unplug(self, hardware: HeadlessDeck):
+        self.plugged.remove(hardware)
+        self.source.remove(hardware.id())
+        await wait_for(lambda: hardware.id() not in self.supervisor.decks)
+
+
+def test_add_remove_and_reconnect(plugin_manager):
+    recorder = plugin_manager.recorder
+
+    async def main():
+        async with Harness(plugin_manager) as harness:
+            hardware = make_hardware()
+            deck = await harness.plug(hardware)
+            deck.writer.set_key_image(3, b"three")
+            await wait_for(lambda: hardware.latest_frames().get(3))
+
+            await harness.unplug(hardware)
+            await wait_for(lambda: recorder.removed)
+            assert deck.closed
+            assert not hardware.is_open()
+            assert harness.supervisor.frames == {"ABC123": {3: b"three"}}
+
+            # The same deck coming back shows what it was showing before straight away
+            replugged = make_hardware()
+            new_deck = await harness.plug(replugged)
+            assert new_deck is not deck
+            await wait_for(lambda: replugged.latest_frames().get(3))
+            assert replugged.latest_frames()[3].image == b"three"
+            assert harness.supervisor.frames == {}
+
+        await asyncio.sleep(0)
+        return deck, new_deck
+
+    deck, new_deck = asyncio.run(main())
+    assert recorder.added == [deck, new_deck]
+    assert recorder.removed == [deck, new_deck]
+
+
+def test_deck_closed_once_when_config_watcher_stops(plugin_manager, config_dir):
+    from asnakedeck.platform.linux import shared_directory_watcher
+
+    recorder = plugin_manager.recorder
+
+    async def main():
+        async with Harness(plugin_manager) as harness:
+            hardware = make_hardware()
+            deck = await harness.plug(hardware)
+
+            # The deck closes itself when its config watcher goes away. It's still plugged in, so the supervisor opens
+            # it afresh without waiting for a device event
+            watcher = shared_directory_watcher(config_dir)
+            assert watcher.task
+            watcher.task.cancel()
+            await wait_for(lambda: deck.closed)
+            await wait_for(lambda: harness.supervisor.decks.get(hardware.id()) not in (None, deck))
+            await asyncio.sleep(0)
+            assert recorder.removed == [deck]
+            return deck, harness.supervisor.decks[hardware.id()]
+
+    deck, new_deck = asyncio.run(main())
+    assert recorder.removed == [deck, new_deck]
+
+
+def test_failed_deck_construction_is_cleaned_up(plugin_manager, config_dir, monkeypatch):
+    from asnakedeck.deck import Deck
+    from asnakedeck.platform.linux import shared_directory_watcher
+
+    attempts = []
+
+    def load_config(self):
+        attempts.append(self)
+        raise OSError("config unreadable")
+
+    monkeypatch.setattr(Deck, "load_config", load_config)
+
+    async def main():
+        async with Harness(plugin_manager) as harness:
+            hardware = make_hardware()
+            harness.plugged.append(hardware)
+            harness.source.add()
+            await wait_for(lambda: attempts)
+            await asyncio.sleep(0.05)
+            assert harness.supervisor.decks == {}
+            assert not hardware.is_open()
+
+            writers = [task for task in asyncio.all_tasks() if task.get_name().startswith("DeckWriter-")]
+            assert all(task.done() for task in writers)
+            assert shared_directory_watcher(config_dir).subscribers == {}
+
+    asyncio.run(main())
+    # Plugins never heard about the deck, so aren't told it went away either
+    assert plugin_manager.recorder.added == []
+    assert plugin_manager.recorder.removed == []